@@ -1,24 +1,176 @@
 import redis.asyncio as redis
+import asyncio
 import json
 import os
-from typing import Optional, Any
+import time
+import uuid
+import fnmatch
+import functools
+import hashlib
+import inspect
+from collections import OrderedDict
+from enum import Enum
+from typing import Optional, Any, Awaitable, Callable, Iterable
 from dotenv import load_dotenv
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import cache_codec as codec
+from .cache_memory import MemoryBackend, register_local_script
 
 load_dotenv()
 
+# Backend: "redis" (default) or "memory" (in-process, single worker; see app/cache_memory.py)
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'redis').lower()
+
 # Redis connection settings
 REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379')
 CACHE_TTL = int(os.getenv('CACHE_TTL', '3600'))  # 1 hour default
+CACHE_SCAN_COUNT = int(os.getenv('CACHE_SCAN_COUNT', '500'))  # keys per SCAN/UNLINK batch
+READ_CACHE_TTL = int(os.getenv('READ_CACHE_TTL', '300'))  # cached read endpoints (invalidated on writes)
+
+# Short timeouts: a slow Redis should cost a request milliseconds, not seconds
+REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', '0.5'))
+REDIS_CONNECT_TIMEOUT = float(os.getenv('REDIS_CONNECT_TIMEOUT', '0.5'))
+
+# Circuit breaker: after CACHE_BREAKER_FAILURES consecutive connection/timeout errors
+# Redis is skipped entirely for CACHE_BREAKER_RESET_SECONDS (callers fall back to the
+# DB at once), then a single probe command decides whether to close it again.
+CACHE_BREAKER_FAILURES = int(os.getenv('CACHE_BREAKER_FAILURES', '5'))
+CACHE_BREAKER_RESET_SECONDS = float(os.getenv('CACHE_BREAKER_RESET_SECONDS', '10'))
 
 # Redis connection pool
 redis_pool = None
+_memory_backend: Optional[MemoryBackend] = None
+
+# Fire-and-forget cache work (background refreshes, cleanup)
+_background_tasks: set = set()
+
+_BREAKER_ERRORS = (redis.ConnectionError, redis.TimeoutError, asyncio.TimeoutError, OSError)
+
+class CircuitOpenError(Exception):
+    """Redis is being skipped because the circuit breaker is open"""
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.times_opened = 0
+        self.short_circuited = 0
+
+    def is_open(self) -> bool:
+        return self.state == "open" and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.short_circuited += 1
+                return False
+            self.state = "half_open"
+            self.probe_in_flight = False
+        # half open: one probe at a time
+        if self.probe_in_flight:
+            self.short_circuited += 1
+            return False
+        self.probe_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        if self.state != "closed":
+            print("Cache circuit closed: Redis is reachable again")
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self, error: Exception) -> None:
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+                print(f"Cache circuit opened for {self.reset_timeout}s: {error}")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "state": "open" if self.is_open() else ("half_open" if self.state != "closed" else "closed"),
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "short_circuited": self.short_circuited,
+            "failure_threshold": self.failure_threshold,
+            "reset_seconds": self.reset_timeout,
+        }
+
+    def release_probe(self) -> None:
+        """A call ended without telling us anything about Redis (e.g. cancelled): let the next one probe"""
+        self.probe_in_flight = False
+
+_breaker = CircuitBreaker(CACHE_BREAKER_FAILURES, CACHE_BREAKER_RESET_SECONDS)
+
+async def _guarded(call: Callable[[], Awaitable[Any]]) -> Any:
+    if not _breaker.allow():
+        raise CircuitOpenError("Redis circuit open")
+    try:
+        result = await call()
+    except _BREAKER_ERRORS as e:
+        _breaker.record_failure(e)
+        raise
+    except Exception:
+        # Redis answered (NOSCRIPT, WRONGTYPE, a decode error, ...): the connection is fine
+        _breaker.record_success()
+        raise
+    finally:
+        # Cancellation or an unexpected error must never leave the half-open probe in flight
+        _breaker.release_probe()
+    _breaker.record_success()
+    return result
+
+class _GuardedPipeline(redis.client.Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        return await _guarded(lambda: super(_GuardedPipeline, self).execute(raise_on_error))
+
+class _GuardedRedis(redis.Redis):
+    """Redis client whose commands go through the circuit breaker"""
+
+    async def execute_command(self, *args, **options):
+        return await _guarded(lambda: super(_GuardedRedis, self).execute_command(*args, **options))
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None):
+        return _GuardedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
 
 async def get_redis():
-    """Get Redis connection"""
-    global redis_pool
+    """Get Redis connection (raises CircuitOpenError while the breaker is open)"""
+    global redis_pool, _memory_backend
+    if CACHE_BACKEND == "memory":
+        if _memory_backend is None:
+            _memory_backend = MemoryBackend()
+        return _memory_backend
+    if _breaker.is_open():
+        _breaker.short_circuited += 1
+        raise CircuitOpenError("Redis circuit open")
     if redis_pool is None:
-        redis_pool = redis.ConnectionPool.from_url(REDIS_URL)
-    return redis.Redis(connection_pool=redis_pool)
+        redis_pool = redis.ConnectionPool.from_url(
+            REDIS_URL,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+        )
+    return _GuardedRedis(connection_pool=redis_pool)
+
+def _cache_error(operation: str, error: Exception) -> None:
+    # An open breaker is expected, not news: stay quiet instead of printing per request
+    if not isinstance(error, CircuitOpenError):
+        print(f"Cache {operation} error: {error}")
+
+def get_breaker_stats() -> dict:
+    return _breaker.stats()
 
 async def close_redis():
     """Close Redis connection"""
@@ -27,74 +179,575 @@ async def close_redis():
         await redis_pool.disconnect()
         redis_pool = None
 
+# L1: per-process TTL/LRU cache in front of Redis (L2)
+#
+# cache_get serves from L1 without a round trip or decode. Writes and deletes
+# drop the key locally and publish it on CACHE_INVALIDATION_CHANNEL so every other
+# worker drops it too. L1_CACHE_TTL bounds staleness if a message is ever missed.
+# Values returned from L1 are shared between callers: treat them as read-only.
+L1_CACHE_ENABLED = os.getenv('L1_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+L1_CACHE_MAX_ITEMS = int(os.getenv('L1_CACHE_MAX_ITEMS', '10000'))
+L1_CACHE_TTL = float(os.getenv('L1_CACHE_TTL', '30'))
+CACHE_INVALIDATION_CHANNEL = os.getenv('CACHE_INVALIDATION_CHANNEL', 'cache:invalidate')
+
+_WORKER_ID = uuid.uuid4().hex
+
+class LocalCache:
+    """Bounded in-process cache with per-entry TTL and LRU eviction"""
+
+    def __init__(self, max_items: int, ttl: float):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_items:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._data.pop(key, None)
+
+    def delete_pattern(self, pattern: str) -> None:
+        for key in [k for k in self._data if fnmatch.fnmatchcase(k, pattern)]:
+            del self._data[key]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+_l1 = LocalCache(L1_CACHE_MAX_ITEMS, L1_CACHE_TTL)
+_tier_stats = {"l1_hits": 0, "l1_misses": 0, "l2_hits": 0, "l2_misses": 0, "invalidations_received": 0}
+_invalidation_task: Optional[asyncio.Task] = None
+
+# Callbacks run with (keys, pattern) whenever keys are deleted, on this worker or another
+_delete_hooks: list = []
+
+def add_delete_hook(func: Callable[[list, Optional[str]], None]) -> None:
+    """Keep derived in-process state (e.g. verified tokens) in step with cache deletes"""
+    _delete_hooks.append(func)
+
+def _run_delete_hooks(keys: list, pattern: Optional[str] = None) -> None:
+    for hook in _delete_hooks:
+        try:
+            hook(keys, pattern)
+        except Exception as e:
+            print(f"Cache delete hook error: {e}")
+
+async def _publish_invalidation(keys: Optional[list] = None, pattern: Optional[str] = None, deleted: bool = False) -> None:
+    if not L1_CACHE_ENABLED:
+        return
+    try:
+        redis_client = await get_redis()
+        message = {"origin": _WORKER_ID, "keys": [k.decode() if isinstance(k, bytes) else k for k in keys or []], "pattern": pattern, "deleted": deleted}
+        await redis_client.publish(CACHE_INVALIDATION_CHANNEL, json.dumps(message))
+    except Exception as e:
+        _cache_error("invalidation publish", e)
+
+def _apply_invalidation(message: dict) -> None:
+    if message.get("origin") == _WORKER_ID:
+        return
+    _tier_stats["invalidations_received"] += 1
+    _l1.delete(*message.get("keys") or [])
+    if message.get("pattern"):
+        _l1.delete_pattern(message["pattern"])
+    if message.get("deleted"):
+        _run_delete_hooks(message.get("keys") or [], message.get("pattern"))
+
+async def _listen_invalidations() -> None:
+    while True:
+        try:
+            if CACHE_BACKEND == "memory":
+                redis_client = await get_redis()
+            else:
+                # Dedicated connection: blocking reads must not hit REDIS_SOCKET_TIMEOUT
+                redis_client = redis.Redis.from_url(REDIS_URL, socket_connect_timeout=REDIS_CONNECT_TIMEOUT)
+            pubsub = redis_client.pubsub()
+            await pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+            # Messages may have been missed while disconnected
+            _l1.clear()
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    _apply_invalidation(json.loads(message["data"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Cache invalidation listener error: {e}")
+            _l1.clear()
+            await asyncio.sleep(1)
+
+async def start_cache_invalidation_listener() -> None:
+    """Subscribe this worker to L1 invalidations (called from the app lifespan)"""
+    global _invalidation_task
+    if L1_CACHE_ENABLED and (_invalidation_task is None or _invalidation_task.done()):
+        _invalidation_task = asyncio.create_task(_listen_invalidations())
+
+async def stop_cache_invalidation_listener() -> None:
+    global _invalidation_task
+    if _invalidation_task is not None:
+        _invalidation_task.cancel()
+        await asyncio.gather(_invalidation_task, return_exceptions=True)
+        _invalidation_task = None
+
+def _hit_rate(hits: int, misses: int) -> Optional[float]:
+    total = hits + misses
+    return round(hits / total, 4) if total else None
+
+def get_tier_stats() -> dict:
+    """Per-tier hit rates for this worker process"""
+    return {
+        **_tier_stats,
+        "l1_hit_rate": _hit_rate(_tier_stats["l1_hits"], _tier_stats["l1_misses"]),
+        "l2_hit_rate": _hit_rate(_tier_stats["l2_hits"], _tier_stats["l2_misses"]),
+        "l1_enabled": L1_CACHE_ENABLED,
+        "l1_size": len(_l1),
+        "l1_evictions": _l1.evictions,
+    }
+
 # Cache utility functions
 async def cache_get(key: str) -> Optional[Any]:
-    """Get value from cache"""
+    """Get value from cache (L1, then Redis)"""
+    if L1_CACHE_ENABLED:
+        value = _l1.get(key)
+        if value is not None:
+            _tier_stats["l1_hits"] += 1
+            return value
+        _tier_stats["l1_misses"] += 1
     try:
         redis_client = await get_redis()
-        value = await redis_client.get(key)
+        # GET + TTL in one round trip so L1 never outlives the Redis entry
+        value, ttl = await redis_client.pipeline(transaction=False).get(key).ttl(key).execute()
         if value:
-            return json.loads(value)
+            _tier_stats["l2_hits"] += 1
+            decoded = codec.decode(value)
+            if L1_CACHE_ENABLED:
+                _l1.set(key, decoded, ttl if ttl and ttl > 0 else None)
+            return decoded
+        _tier_stats["l2_misses"] += 1
         return None
     except Exception as e:
-        print(f"Cache get error: {e}")
+        _cache_error("get", e)
         return None
 
 async def cache_set(key: str, value: Any, ttl: int = CACHE_TTL) -> bool:
     """Set value in cache"""
     try:
         redis_client = await get_redis()
-        await redis_client.setex(key, ttl, json.dumps(value, default=str))
+        await redis_client.setex(key, ttl, codec.encode(value))
+        _l1.delete(key)
+        await _publish_invalidation(keys=[key])
         return True
     except Exception as e:
-        print(f"Cache set error: {e}")
+        _cache_error("set", e)
+        return False
+
+async def cache_get_many(keys: list) -> dict:
+    """Get several values: L1 first, then one Redis round trip for the rest. Returns {key: value} for hits"""
+    found = {}
+    missing = []
+    for key in dict.fromkeys(keys):
+        value = _l1.get(key) if L1_CACHE_ENABLED else None
+        if value is not None:
+            _tier_stats["l1_hits"] += 1
+            found[key] = value
+        else:
+            if L1_CACHE_ENABLED:
+                _tier_stats["l1_misses"] += 1
+            missing.append(key)
+    if not missing:
+        return found
+    try:
+        redis_client = await get_redis()
+        pipe = redis_client.pipeline(transaction=False).mget(missing)
+        for key in missing:
+            pipe.ttl(key)
+        values, *ttls = await pipe.execute()
+    except Exception as e:
+        _cache_error("get many", e)
+        return found
+    for key, value, ttl in zip(missing, values, ttls):
+        if not value:
+            _tier_stats["l2_misses"] += 1
+            continue
+        try:
+            decoded = codec.decode(value)
+        except Exception as e:
+            _cache_error("decode", e)
+            continue
+        _tier_stats["l2_hits"] += 1
+        found[key] = decoded
+        if L1_CACHE_ENABLED:
+            _l1.set(key, decoded, ttl if ttl and ttl > 0 else None)
+    return found
+
+async def cache_set_many(values: dict, ttl: int = CACHE_TTL) -> bool:
+    """Set several values in one round trip"""
+    if not values:
+        return True
+    try:
+        redis_client = await get_redis()
+        pipe = redis_client.pipeline(transaction=False)
+        for key, value in values.items():
+            pipe.setex(key, ttl, codec.encode(value))
+        await pipe.execute()
+        _l1.delete(*values)
+        await _publish_invalidation(keys=list(values))
+        return True
+    except Exception as e:
+        _cache_error("set many", e)
         return False
 
 async def cache_delete(key: str) -> bool:
     """Delete value from cache"""
+    _l1.delete(key)
+    _run_delete_hooks([key])
     try:
         redis_client = await get_redis()
         await redis_client.delete(key)
+        await _publish_invalidation(keys=[key], deleted=True)
         return True
     except Exception as e:
-        print(f"Cache delete error: {e}")
+        _cache_error("delete", e)
+        return False
+
+async def cache_delete_many(keys: list) -> bool:
+    """Delete several keys in one round trip"""
+    if not keys:
+        return True
+    _l1.delete(*keys)
+    _run_delete_hooks(keys)
+    try:
+        redis_client = await get_redis()
+        await redis_client.delete(*keys)
+        await _publish_invalidation(keys=keys, deleted=True)
+        return True
+    except Exception as e:
+        _cache_error("delete many", e)
         return False
 
 async def cache_delete_pattern(pattern: str) -> bool:
-    """Delete all keys matching pattern"""
+    """Delete all keys matching pattern (SCAN + UNLINK, never blocks Redis like KEYS)"""
+    _l1.delete_pattern(pattern)
+    _run_delete_hooks([], pattern)
     try:
         redis_client = await get_redis()
-        keys = await redis_client.keys(pattern)
-        if keys:
-            await redis_client.delete(*keys)
+        await _publish_invalidation(pattern=pattern, deleted=True)
+        batch = []
+        async for key in redis_client.scan_iter(match=pattern, count=CACHE_SCAN_COUNT):
+            batch.append(key)
+            if len(batch) >= CACHE_SCAN_COUNT:
+                await redis_client.unlink(*batch)
+                batch = []
+        if batch:
+            await redis_client.unlink(*batch)
         return True
     except Exception as e:
-        print(f"Cache delete pattern error: {e}")
+        _cache_error("delete pattern", e)
         return False
 
+def _spawn(coro) -> None:
+    """Run a coroutine in the background, keeping a reference until it finishes"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+# Versioned namespaces
+#
+# Keys of a namespace embed its version: "{namespace}:v{n}:...". Invalidating the
+# namespace is a single INCR; readers build keys with the new version and never see
+# the old entries, which are unlinked by a background SCAN (and expire anyway).
+def _namespace_version_key(namespace: str) -> str:
+    return f"ns:{namespace}:version"
+
+async def cache_namespace_key(namespace: str, *parts: Any) -> str:
+    """Current key for `parts` in `namespace`"""
+    try:
+        redis_client = await get_redis()
+        version = int(await redis_client.get(_namespace_version_key(namespace)) or 0)
+    except Exception as e:
+        _cache_error("namespace version", e)
+        version = 0
+    return ":".join([namespace, f"v{version}", *(str(p) for p in parts)])
+
+async def cache_namespace_versions(namespaces: Iterable[str]) -> list:
+    """Current versions of several namespaces in one round trip (raises if the cache is unavailable)"""
+    namespaces = list(namespaces)
+    if not namespaces:
+        return []
+    redis_client = await get_redis()
+    values = await redis_client.mget([_namespace_version_key(ns) for ns in namespaces])
+    return [int(v or 0) for v in values]
+
+# Epoch seconds of the last namespace invalidation or mark-stale. read_routing keeps reads on the
+# primary for a while after it, so the recomputes and cache fills that follow don't store replica-stale data
+LAST_INVALIDATION_KEY = "cache:last_invalidation"
+
+async def _note_invalidation(redis_client) -> None:
+    await redis_client.set(LAST_INVALIDATION_KEY, time.time(), ex=3600)
+
+async def cache_invalidate_namespace(namespace: str) -> bool:
+    """Invalidate every key in `namespace` with one INCR; old keys are cleaned up in the background"""
+    try:
+        redis_client = await get_redis()
+        version = await redis_client.incr(_namespace_version_key(namespace))
+        await _note_invalidation(redis_client)
+        _spawn(cache_delete_pattern(f"{namespace}:v{version - 1}:*"))
+        return True
+    except Exception as e:
+        _cache_error("invalidate namespace", e)
+        return False
+
+# Stale-while-revalidate
+#
+# Values are stored as {"v": value, "t": computed_at} and kept for ttl + SWR_STALE_TTL.
+# Past `ttl` (or after cache_mark_stale on the namespace) a value is stale: it is still
+# served, and one worker recomputes it in the background under a Redis lock. Values in
+# the last SWR_REFRESH_AHEAD fraction of their ttl are refreshed ahead of expiry the
+# same way, so hot keys rarely go stale at all. Only a cold miss waits on a recompute.
+SWR_STALE_TTL = int(os.getenv('SWR_STALE_TTL', '3600'))
+SWR_REFRESH_AHEAD = float(os.getenv('SWR_REFRESH_AHEAD', '0.1'))
+SWR_LOCK_TTL = int(os.getenv('SWR_LOCK_TTL', '30'))
+SWR_MISS_WAIT = float(os.getenv('SWR_MISS_WAIT', '5'))  # seconds a cold miss waits for another worker's recompute
+
+_RELEASE_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+def _release_lock_local(backend: MemoryBackend, keys: list, args: list) -> int:
+    if backend.get_now(keys[0]) == str(args[0]).encode():
+        return backend.delete_now(keys[0])
+    return 0
+
+register_local_script(_RELEASE_LOCK, _release_lock_local)
+
+_swr_stats = {
+    "fresh_hits": 0,
+    "stale_serves": 0,
+    "refresh_ahead": 0,
+    "misses": 0,
+    "miss_waits": 0,
+    "recomputes": 0,
+    "recompute_failures": 0,
+    "lock_contended": 0,
+}
+
+def _swr_stale_key(namespace: str) -> str:
+    return f"swr:stale_before:{namespace}"
+
+async def cache_mark_stale(namespace: str) -> bool:
+    """Mark every SWR value under `namespace` stale (served until recomputed, not deleted)"""
+    try:
+        redis_client = await get_redis()
+        await redis_client.set(_swr_stale_key(namespace), time.time(), ex=SWR_STALE_TTL + CACHE_TTL)
+        await _note_invalidation(redis_client)
+        return True
+    except Exception as e:
+        _cache_error("mark stale", e)
+        return False
+
+async def _swr_recompute(key: str, compute: Callable[[], Awaitable[Any]], ttl: int, token: str) -> Any:
+    redis_client = await get_redis()
+    try:
+        try:
+            value = await compute()
+        except Exception:
+            _swr_stats["recompute_failures"] += 1
+            raise
+        _swr_stats["recomputes"] += 1
+        # Best effort: the value is computed, a failed cache write must not fail the caller
+        try:
+            await redis_client.setex(key, ttl + SWR_STALE_TTL, codec.encode({"v": value, "t": time.time()}))
+        except Exception as e:
+            _cache_error("set", e)
+        return value
+    finally:
+        try:
+            await redis_client.eval(_RELEASE_LOCK, 1, f"swr:lock:{key}", token)
+        except Exception as e:
+            _cache_error("lock release", e)
+
+async def _swr_try_lock(key: str) -> Optional[str]:
+    token = uuid.uuid4().hex
+    redis_client = await get_redis()
+    if await redis_client.set(f"swr:lock:{key}", token, nx=True, ex=SWR_LOCK_TTL):
+        return token
+    _swr_stats["lock_contended"] += 1
+    return None
+
+def _swr_background(key: str, compute: Callable[[], Awaitable[Any]], ttl: int, token: str) -> None:
+    async def run():
+        try:
+            await _swr_recompute(key, compute, ttl, token)
+        except Exception as e:
+            _cache_error(f"background refresh of {key}", e)
+    _spawn(run())
+
+async def cache_get_or_compute(key: str, namespace: str, compute: Callable[[], Awaitable[Any]], ttl: int = CACHE_TTL) -> Any:
+    """
+    Stale-while-revalidate read. `compute` must not depend on the request's DB session:
+    it may run in the background after the response has been sent.
+    """
+    try:
+        redis_client = await get_redis()
+        raw, stale_before = await redis_client.mget(key, _swr_stale_key(namespace))
+    except Exception as e:
+        _cache_error("get", e)
+        return await compute()
+
+    try:
+        envelope = codec.decode(raw) if raw else None
+    except Exception as e:
+        _cache_error("decode", e)
+        envelope = None
+    if isinstance(envelope, dict) and "t" in envelope:
+        age = time.time() - envelope["t"]
+        stale = age >= ttl or (stale_before is not None and envelope["t"] < float(stale_before))
+        if stale:
+            _swr_stats["stale_serves"] += 1
+        elif age >= ttl * (1 - SWR_REFRESH_AHEAD):
+            _swr_stats["refresh_ahead"] += 1
+        else:
+            _swr_stats["fresh_hits"] += 1
+            return envelope["v"]
+        try:
+            token = await _swr_try_lock(key)
+            if token:
+                _swr_background(key, compute, ttl, token)
+        except Exception as e:
+            _cache_error("lock", e)
+        return envelope["v"]
+
+    # Cold miss: one worker computes, the others wait briefly for its result
+    _swr_stats["misses"] += 1
+    try:
+        token = await _swr_try_lock(key)
+    except Exception as e:
+        _cache_error("lock", e)
+        return await compute()
+    if token:
+        return await _swr_recompute(key, compute, ttl, token)
+
+    _swr_stats["miss_waits"] += 1
+    deadline = time.monotonic() + SWR_MISS_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+        try:
+            raw = await redis_client.get(key)
+        except Exception:
+            break
+        if raw:
+            return codec.decode(raw)["v"]
+    return await compute()
+
+def get_swr_stats() -> dict:
+    """SWR counters for this worker process"""
+    return dict(_swr_stats)
+
 # Cache decorator for functions
-def cache_result(ttl: int = CACHE_TTL, key_prefix: str = ""):
-    """Decorator to cache function results"""
+#
+# Keys are "{key_prefix}{module}.{qualname}:{digest}", where the digest is a blake2b
+# hash of the bound arguments serialized canonically, so every worker and every
+# restart computes the same key. Request-scoped arguments (DB sessions, requests,
+# responses) never reach the key; other arguments can be dropped with `exclude`
+# (e.g. the authenticated user when the result does not depend on it) or the whole
+# variable part replaced with `key_func(*args, **kwargs)`. With `namespace`, keys
+# are versioned and the namespace can be invalidated with cache_invalidate_namespace.
+_UNKEYED_TYPES = (AsyncSession, Request, Response)
+
+_function_stats: dict = {}
+
+def _stable_default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    return str(value)
+
+def make_cache_key(func: Callable, args: tuple, kwargs: dict, exclude: Iterable[str] = ()) -> str:
+    """Stable digest of the arguments `func` was called with"""
+    bound = inspect.signature(func).bind_partial(*args, **kwargs)
+    bound.apply_defaults()
+    keyed = {
+        name: value for name, value in bound.arguments.items()
+        if name not in exclude and not isinstance(value, _UNKEYED_TYPES)
+    }
+    canonical = json.dumps(keyed, sort_keys=True, default=_stable_default, separators=(",", ":"))
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+def cache_result(
+    ttl: int = CACHE_TTL,
+    key_prefix: str = "",
+    *,
+    namespace: Optional[str] = None,
+    key_func: Optional[Callable[..., str]] = None,
+    exclude: Iterable[str] = (),
+):
+    """Decorator to cache function results (safe on FastAPI endpoints: the signature is preserved)"""
+    exclude = frozenset(exclude)
+
     def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+        stats = _function_stats.setdefault(name, {"hits": 0, "misses": 0})
+
+        @functools.wraps(func)
         async def wrapper(*args, **kwargs):
-            # Create cache key from function name and arguments
-            cache_key = f"{key_prefix}{func.__name__}:{hash(str(args) + str(kwargs))}"
-            
+            variable = key_func(*args, **kwargs) if key_func else make_cache_key(func, args, kwargs, exclude)
+            if namespace:
+                cache_key = await cache_namespace_key(namespace, f"{key_prefix}{name}", variable)
+            else:
+                cache_key = f"{key_prefix}{name}:{variable}"
+
             # Check cache
             cached_result = await cache_get(cache_key)
             if cached_result is not None:
+                stats["hits"] += 1
                 return cached_result
-            
+            stats["misses"] += 1
+
             # Execute function
             result = await func(*args, **kwargs)
-            
-            # Cache result
-            await cache_set(cache_key, result, ttl)
-            
+
+            # Cache result: the JSON form of the whole value, so models nested in dicts/lists survive a hit
+            await cache_set(cache_key, jsonable_encoder(result), ttl)
+
             return result
         return wrapper
     return decorator
 
+def get_cache_result_stats() -> dict:
+    """Hit/miss counts per decorated function for this worker process"""
+    return {
+        name: {**counts, "hit_rate": _hit_rate(counts["hits"], counts["misses"])}
+        for name, counts in _function_stats.items()
+    }
+
+def _response_cache_stats() -> dict:
+    from .response_cache import get_response_cache_stats
+    return get_response_cache_stats()
+
 # Cache statistics
 async def get_cache_stats():
     """Get cache statistics"""
@@ -102,11 +755,17 @@ async def get_cache_stats():
         redis_client = await get_redis()
         info = await redis_client.info()
         return {
+            "backend": CACHE_BACKEND,
             "connected_clients": info.get("connected_clients", 0),
             "used_memory": info.get("used_memory_human", "0B"),
             "keyspace_hits": info.get("keyspace_hits", 0),
             "keyspace_misses": info.get("keyspace_misses", 0),
-            "total_commands_processed": info.get("total_commands_processed", 0)
+            "total_commands_processed": info.get("total_commands_processed", 0),
+            "swr": get_swr_stats(),
+            "tiers": get_tier_stats(),
+            "functions": get_cache_result_stats(),
+            "breaker": get_breaker_stats(),
+            "responses": _response_cache_stats()
         }
     except Exception as e:
-        return {"error": str(e)}
+        return {"error": str(e), "backend": CACHE_BACKEND, "swr": get_swr_stats(), "tiers": get_tier_stats(), "functions": get_cache_result_stats(), "breaker": get_breaker_stats(), "responses": _response_cache_stats()}
@@ -0,0 +1,84 @@
+"""
+Serialization for values stored in Redis.
+
+Encoded values start with a 4-byte header: MAGIC, FORMAT_VERSION, codec id,
+compression id. Anything without the header is a legacy plain-JSON value and is
+still readable, so codecs can be switched (CACHE_CODEC) on a running fleet:
+every worker reads every format, and only the writer's choice changes.
+"""
+
+import json
+import os
+import zlib
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # falls back to the stdlib codec
+    orjson = None
+
+MAGIC = 0xC1  # never the first byte of UTF-8 JSON
+FORMAT_VERSION = 1
+HEADER_SIZE = 4
+
+CODEC_JSON = ord("j")
+CODEC_ORJSON = ord("o")
+COMPRESSION_NONE = ord("-")
+COMPRESSION_ZLIB = ord("z")
+
+CACHE_CODEC = os.getenv("CACHE_CODEC", "orjson")  # orjson | json
+CACHE_COMPRESS_MIN_BYTES = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "2048"))
+CACHE_COMPRESS_LEVEL = int(os.getenv("CACHE_COMPRESS_LEVEL", "1"))
+
+
+def _json_dumps(value: Any) -> bytes:
+    return json.dumps(value, default=str).encode()
+
+
+def _orjson_dumps(value: Any) -> bytes:
+    return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+
+_DUMPS = {CODEC_JSON: _json_dumps}
+_LOADS = {CODEC_JSON: json.loads}
+if orjson is not None:
+    _DUMPS[CODEC_ORJSON] = _orjson_dumps
+    _LOADS[CODEC_ORJSON] = orjson.loads
+
+
+def _codec_id(name: str) -> int:
+    if name == "orjson" and orjson is not None:
+        return CODEC_ORJSON
+    return CODEC_JSON
+
+
+def encode(value: Any, codec: str = CACHE_CODEC, compress_min_bytes: int = CACHE_COMPRESS_MIN_BYTES) -> bytes:
+    """Serialize `value` with a header; bodies of at least `compress_min_bytes` are zlib-compressed"""
+    codec_id = _codec_id(codec)
+    body = _DUMPS[codec_id](value)
+    compression = COMPRESSION_NONE
+    if compress_min_bytes > 0 and len(body) >= compress_min_bytes:
+        compressed = zlib.compress(body, CACHE_COMPRESS_LEVEL)
+        if len(compressed) < len(body):
+            body, compression = compressed, COMPRESSION_ZLIB
+    return bytes((MAGIC, FORMAT_VERSION, codec_id, compression)) + body
+
+
+def decode(raw: Any) -> Any:
+    """Inverse of encode(); also accepts legacy plain-JSON values"""
+    if isinstance(raw, str):
+        raw = raw.encode()
+    if len(raw) < HEADER_SIZE or raw[0] != MAGIC:
+        return json.loads(raw)
+    version, codec_id, compression = raw[1], raw[2], raw[3]
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported cache format version {version}")
+    body = raw[HEADER_SIZE:]
+    if compression == COMPRESSION_ZLIB:
+        body = zlib.decompress(body)
+    elif compression != COMPRESSION_NONE:
+        raise ValueError(f"Unsupported cache compression {compression}")
+    loads = _LOADS.get(codec_id)
+    if loads is None:
+        raise ValueError(f"Unsupported cache codec {chr(codec_id)}")
+    return loads(body)
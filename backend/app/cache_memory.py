@@ -0,0 +1,251 @@
+"""
+In-process cache backend (CACHE_BACKEND=memory).
+
+Implements the subset of the redis.asyncio client that app.cache and its
+callers use: strings with TTL, INCR, MGET, SCAN with patterns, pipelines,
+pub/sub within the process, and EVAL/EVALSHA for scripts that have a
+registered Python equivalent. Everything lives in one process: use it for tests,
+benchmarks and single-worker installs, not for multi-worker deployments
+(workers would not share entries, locks or invalidations).
+"""
+
+import asyncio
+import fnmatch
+import hashlib
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Protocol, Tuple
+
+
+class CacheBackend(Protocol):
+    """Commands app.cache relies on (satisfied by redis.asyncio.Redis and MemoryBackend)"""
+
+    async def get(self, key: str) -> Optional[bytes]: ...
+    async def set(self, key: str, value: Any, ex: Optional[int] = None, nx: bool = False) -> Optional[bool]: ...
+    async def setex(self, key: str, ttl: int, value: Any) -> bool: ...
+    async def mget(self, keys, *args) -> List[Optional[bytes]]: ...
+    async def ttl(self, key: str) -> int: ...
+    async def incr(self, key: str, amount: int = 1) -> int: ...
+    async def delete(self, *keys: str) -> int: ...
+    async def unlink(self, *keys: str) -> int: ...
+    def scan_iter(self, match: Optional[str] = None, count: Optional[int] = None) -> AsyncIterator[bytes]: ...
+    async def publish(self, channel: str, message: Any) -> int: ...
+    async def eval(self, script: str, numkeys: int, *keys_and_args: Any) -> Any: ...
+    async def evalsha(self, sha: str, numkeys: int, *keys_and_args: Any) -> Any: ...
+    async def script_load(self, script: str) -> str: ...
+    async def info(self) -> dict: ...
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None): ...
+    def pubsub(self): ...
+
+
+# Python equivalents of Lua scripts, keyed by script text:
+# func(backend, keys, args) -> result, run without awaiting anything (atomic in-process)
+_LOCAL_SCRIPTS: Dict[str, Callable[["MemoryBackend", list, list], Any]] = {}
+_LOCAL_SCRIPTS_BY_SHA: Dict[str, Callable[["MemoryBackend", list, list], Any]] = {}
+
+
+def script_sha(script: str) -> str:
+    """SHA1 Redis uses to name a script (EVALSHA / SCRIPT LOAD)"""
+    return hashlib.sha1(script.encode()).hexdigest()
+
+
+def register_local_script(script: str, func: Callable[["MemoryBackend", list, list], Any]) -> None:
+    _LOCAL_SCRIPTS[script] = func
+    _LOCAL_SCRIPTS_BY_SHA[script_sha(script)] = func
+
+
+def _to_bytes(value: Any) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode()
+
+
+def _to_str(key: Any) -> str:
+    return key.decode() if isinstance(key, bytes) else str(key)
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._data: Dict[str, Tuple[bytes, Optional[float]]] = {}  # key -> (value, expires_at)
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+        self.commands = 0
+
+    # ---- helpers used by local scripts (synchronous) ----
+    def get_now(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def set_now(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._data[key] = (_to_bytes(value), time.monotonic() + ttl if ttl else None)
+
+    def delete_now(self, *keys: str) -> int:
+        removed = 0
+        for key in keys:
+            if self.get_now(_to_str(key)) is not None:
+                del self._data[_to_str(key)]
+                removed += 1
+        return removed
+
+    # ---- redis.asyncio-compatible commands ----
+    async def get(self, key: str) -> Optional[bytes]:
+        self.commands += 1
+        return self.get_now(key)
+
+    async def set(self, key: str, value: Any, ex: Optional[int] = None, nx: bool = False, px: Optional[int] = None) -> Optional[bool]:
+        self.commands += 1
+        if nx and self.get_now(key) is not None:
+            return None
+        ttl = ex if ex is not None else (px / 1000 if px is not None else None)
+        self.set_now(key, value, ttl)
+        return True
+
+    async def setex(self, key: str, ttl: int, value: Any) -> bool:
+        self.commands += 1
+        self.set_now(key, value, ttl)
+        return True
+
+    async def mget(self, keys, *args) -> List[Optional[bytes]]:
+        self.commands += 1
+        keys = ([keys] if isinstance(keys, (str, bytes)) else list(keys)) + list(args)
+        return [self.get_now(_to_str(k)) for k in keys]
+
+    async def ttl(self, key: str) -> int:
+        self.commands += 1
+        if self.get_now(key) is None:
+            return -2
+        expires_at = self._data[key][1]
+        return -1 if expires_at is None else max(int(expires_at - time.monotonic()), 0)
+
+    async def expire(self, key: str, ttl: int) -> bool:
+        self.commands += 1
+        value = self.get_now(key)
+        if value is None:
+            return False
+        self.set_now(key, value, ttl)
+        return True
+
+    async def incr(self, key: str, amount: int = 1) -> int:
+        self.commands += 1
+        entry = self._data.get(key)
+        value = int(self.get_now(key) or 0) + amount
+        self._data[key] = (_to_bytes(value), entry[1] if entry else None)
+        return value
+
+    async def delete(self, *keys: str) -> int:
+        self.commands += 1
+        return self.delete_now(*keys)
+
+    async def unlink(self, *keys: str) -> int:
+        return await self.delete(*keys)
+
+    async def scan_iter(self, match: Optional[str] = None, count: Optional[int] = None) -> AsyncIterator[bytes]:
+        self.commands += 1
+        for key in list(self._data):
+            if self.get_now(key) is not None and (match is None or fnmatch.fnmatchcase(key, match)):
+                yield key.encode()
+
+    async def publish(self, channel: str, message: Any) -> int:
+        self.commands += 1
+        queues = self._subscribers.get(channel, [])
+        for queue in queues:
+            queue.put_nowait({"type": "message", "channel": channel.encode(), "data": _to_bytes(message)})
+        return len(queues)
+
+    async def eval(self, script: str, numkeys: int, *keys_and_args: Any) -> Any:
+        self.commands += 1
+        func = _LOCAL_SCRIPTS.get(script)
+        if func is None:
+            raise NotImplementedError("Script has no local equivalent registered")
+        return func(self, [_to_str(k) for k in keys_and_args[:numkeys]], list(keys_and_args[numkeys:]))
+
+    async def evalsha(self, sha: str, numkeys: int, *keys_and_args: Any) -> Any:
+        self.commands += 1
+        func = _LOCAL_SCRIPTS_BY_SHA.get(sha)
+        if func is None:
+            raise NotImplementedError("Script has no local equivalent registered")
+        return func(self, [_to_str(k) for k in keys_and_args[:numkeys]], list(keys_and_args[numkeys:]))
+
+    async def script_load(self, script: str) -> str:
+        # Registered twins are always "loaded"
+        self.commands += 1
+        if script not in _LOCAL_SCRIPTS:
+            raise NotImplementedError("Script has no local equivalent registered")
+        return script_sha(script)
+
+    async def ping(self) -> bool:
+        return True
+
+    async def info(self) -> dict:
+        return {
+            "connected_clients": 1,
+            "used_memory_human": f"{sum(len(v) for v, _ in self._data.values())}B",
+            "keyspace_hits": 0,
+            "keyspace_misses": 0,
+            "total_commands_processed": self.commands,
+        }
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> "MemoryPipeline":
+        return MemoryPipeline(self)
+
+    def pubsub(self) -> "MemoryPubSub":
+        return MemoryPubSub(self)
+
+    async def close(self) -> None:
+        pass
+
+    aclose = close
+
+
+class MemoryPipeline:
+    """Queues commands and runs them in order on execute()"""
+
+    def __init__(self, backend: MemoryBackend):
+        self._backend = backend
+        self._queued: List[Tuple[str, tuple, dict]] = []
+
+    def __getattr__(self, name: str):
+        if not hasattr(self._backend, name):
+            raise AttributeError(name)
+
+        def queue(*args, **kwargs):
+            self._queued.append((name, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self, raise_on_error: bool = True) -> list:
+        queued, self._queued = self._queued, []
+        return [await getattr(self._backend, name)(*args, **kwargs) for name, args, kwargs in queued]
+
+
+class MemoryPubSub:
+    def __init__(self, backend: MemoryBackend):
+        self._backend = backend
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._channels: List[str] = []
+
+    async def subscribe(self, *channels: str) -> None:
+        for channel in channels:
+            self._backend._subscribers.setdefault(channel, []).append(self._queue)
+            self._channels.append(channel)
+
+    async def unsubscribe(self, *channels: str) -> None:
+        for channel in channels or list(self._channels):
+            queues = self._backend._subscribers.get(channel, [])
+            if self._queue in queues:
+                queues.remove(self._queue)
+            if channel in self._channels:
+                self._channels.remove(channel)
+
+    async def listen(self) -> AsyncIterator[dict]:
+        while True:
+            yield await self._queue.get()
+
+    async def close(self) -> None:
+        await self.unsubscribe()
+
+    aclose = close
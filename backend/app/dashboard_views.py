@@ -0,0 +1,153 @@
+"""
+Materialized views for /dashboard/candidate-stages (weekly, monthly, yearly).
+
+Each view holds the live query's result for one period at refresh time, with
+both counters: `transitions` (every stage in the bucket) and `latest` (latest
+stage per candidate within the bucket). Views are refreshed CONCURRENTLY by the
+in-process scheduler and every refresh is recorded in `dashboard_view_refreshes`,
+so readers can decide whether a view is fresh enough for them.
+
+Enable with DASHBOARD_VIEWS_ENABLED=true.
+"""
+
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, rollups, schemas
+from .db import engine
+from .scheduler import register_job
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_VIEWS_ENABLED = os.getenv("DASHBOARD_VIEWS_ENABLED", "false").lower() in ("1", "true", "yes")
+DASHBOARD_VIEW_REFRESH_SECONDS = int(os.getenv("DASHBOARD_VIEW_REFRESH_SECONDS", "300"))
+DEFAULT_MAX_STALENESS = int(os.getenv("DASHBOARD_VIEW_MAX_STALENESS", "900"))
+
+# period -> (view name, date_trunc unit, window the live query applies)
+VIEWS = {
+    schemas.PeriodEnum.weekly: ("mv_dashboard_stages_weekly", "week", "1 year"),
+    schemas.PeriodEnum.monthly: ("mv_dashboard_stages_monthly", "month", "1 year"),
+    schemas.PeriodEnum.yearly: ("mv_dashboard_stages_yearly", "year", "5 years"),
+}
+
+
+def _view_select(unit: str, window: str):
+    """Same rows as the live dashboard query for one period, with both counters."""
+    cs = models.CandidateStages
+    prev_stage = func.lag(cs.stage_key).over(
+        partition_by=cs.candidate_id,
+        order_by=cs.entered_at.asc(),
+    )
+    bucket = func.date_trunc(unit, func.timezone(rollups.TZ_NAME, cs.entered_at))
+    ranked = (
+        select(
+            bucket.label("bucket_start"),
+            rollups.stage_label_expr(cs.stage_key, prev_stage).label("stage_label"),
+            func.row_number().over(
+                partition_by=(cs.candidate_id, bucket),
+                order_by=cs.entered_at.desc(),
+            ).label("rn"),
+        )
+        .where(cs.entered_at >= func.now() - text(f"interval '{window}'"), cs.entered_at <= func.now())
+        .subquery("ranked")
+    )
+    return (
+        select(
+            ranked.c.bucket_start,
+            ranked.c.stage_label,
+            func.count().label("transitions"),
+            func.count().filter(ranked.c.rn == 1).label("latest"),
+        )
+        .group_by(ranked.c.bucket_start, ranked.c.stage_label)
+    )
+
+
+def _create_view_ddl(name: str, unit: str, window: str) -> List[str]:
+    body = _view_select(unit, window).compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    return [
+        f"CREATE MATERIALIZED VIEW IF NOT EXISTS {name} AS {body} WITH NO DATA",
+        # REFRESH ... CONCURRENTLY needs a unique index
+        f"CREATE UNIQUE INDEX IF NOT EXISTS {name}_key ON {name} (bucket_start, stage_label)",
+    ]
+
+
+async def ensure_dashboard_views() -> None:
+    """Create missing views (unpopulated; the first refresh fills them)."""
+    async with engine.begin() as conn:
+        for name, unit, window in VIEWS.values():
+            for ddl in _create_view_ddl(name, unit, window):
+                await conn.execute(text(ddl))
+    logger.info("Dashboard materialized views ensured")
+
+
+async def refresh_dashboard_views() -> None:
+    """Refresh every view (CONCURRENTLY once populated) and record when it happened."""
+    table = models.DashboardViewRefresh.__table__
+    for name, _, _ in VIEWS.values():
+        started = time.perf_counter()
+        async with engine.begin() as conn:
+            populated = (await conn.execute(
+                text("select ispopulated from pg_matviews where matviewname = :name"), {"name": name}
+            )).scalar()
+            # CONCURRENTLY keeps readers unblocked but only works on a populated view
+            mode = "CONCURRENTLY " if populated else ""
+            await conn.execute(text(f"REFRESH MATERIALIZED VIEW {mode}{name}"))
+            duration_ms = int((time.perf_counter() - started) * 1000)
+            stmt = pg_insert(table).values(view_name=name, refreshed_at=func.now(), duration_ms=duration_ms)
+            await conn.execute(stmt.on_conflict_do_update(
+                index_elements=[table.c.view_name],
+                set_={"refreshed_at": stmt.excluded.refreshed_at, "duration_ms": stmt.excluded.duration_ms},
+            ))
+        logger.info(f"Refreshed {name} in {duration_ms}ms")
+
+
+def register_refresh_job() -> None:
+    register_job("dashboard_views_refresh", DASHBOARD_VIEW_REFRESH_SECONDS, refresh_dashboard_views)
+
+
+async def get_view_staleness(db: AsyncSession) -> Dict[str, Optional[float]]:
+    """Seconds since each view was last refreshed (None = never)."""
+    result = await db.execute(select(models.DashboardViewRefresh.view_name, models.DashboardViewRefresh.refreshed_at))
+    refreshed = {name: at for name, at in result.all()}
+    now = datetime.now(timezone.utc)
+    return {
+        name: (now - refreshed[name]).total_seconds() if name in refreshed else None
+        for name, _, _ in VIEWS.values()
+    }
+
+
+async def fetch_view_stage_rows(
+    db: AsyncSession,
+    period: schemas.PeriodEnum,
+    latest_per_candidate_bucket: bool,
+    max_staleness: int,
+):
+    """
+    (bucket_start, stage_label, count) rows from the period's view, or None when
+    views are disabled, the period has no view, or the view is older than `max_staleness` seconds.
+    """
+    if not DASHBOARD_VIEWS_ENABLED or period not in VIEWS:
+        return None
+    name = VIEWS[period][0]
+    refreshed_at = (await db.execute(
+        select(models.DashboardViewRefresh.refreshed_at).where(models.DashboardViewRefresh.view_name == name)
+    )).scalar()
+    if refreshed_at is None or (datetime.now(timezone.utc) - refreshed_at).total_seconds() > max_staleness:
+        return None
+
+    column = "latest" if latest_per_candidate_bucket else "transitions"
+    result = await db.execute(text(
+        f"select bucket_start, stage_label, {column} as cnt from {name} "
+        f"where {column} > 0 order by bucket_start, stage_label"
+    ))
+    return result.all()
@@ -55,6 +55,37 @@ AsyncSessionLocal = async_sessionmaker(
 Base = declarative_base()
 
 
+# ==================== HR READ REPLICA (optional) ====================
+# Streaming replica of the HR database for read-only routes (see app.read_routing)
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')
+
+replica_engine = create_async_engine(
+    DATABASE_REPLICA_URL,
+    future=True,
+    echo=False,
+    pool_size=int(os.getenv('REPLICA_POOL_SIZE', 10)),
+    max_overflow=int(os.getenv('REPLICA_MAX_OVERFLOW', 20)),
+    pool_timeout=int(os.getenv('REPLICA_POOL_TIMEOUT', 5)),  # short: fall back to the primary instead of queueing
+    pool_recycle=int(os.getenv('POOL_RECYCLE', 1800)),
+    pool_pre_ping=os.getenv('POOL_PRE_PING', 'true').lower() == 'true',
+    connect_args={
+        "command_timeout": int(os.getenv('DB_COMMAND_TIMEOUT', 60)),
+        "timeout": int(os.getenv('REPLICA_CONNECT_TIMEOUT', 2)),
+        "server_settings": {
+            "application_name": "hr_system_backend_read",
+            "tcp_keepalives_idle": "600",
+            "tcp_keepalives_interval": "30",
+            "tcp_keepalives_count": "3",
+        }
+    }
+) if DATABASE_REPLICA_URL else None
+ReplicaAsyncSessionLocal = async_sessionmaker(
+    bind=replica_engine,
+    class_=AsyncSession,
+    expire_on_commit=False
+) if replica_engine is not None else None
+
+
 # ==================== ATTENDANCE DATABASE ====================
 # Production-ready connection settings for Attendance database
 attendance_engine = create_async_engine(
@@ -163,6 +194,19 @@ async def get_pool_status():
         "invalid": pool.invalid()
     }
 
+async def get_replica_pool_status():
+    """Get HR read replica pool status (None when no replica is configured)"""
+    if replica_engine is None:
+        return None
+    pool = replica_engine.pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "invalid": pool.invalid()
+    }
+
 async def get_attendance_pool_status():
     """Get Attendance database pool status"""
     pool = attendance_engine.pool
@@ -1,4 +1,7 @@
 import json
+import os
+import time
+from collections import OrderedDict
 from fastapi import Depends, File, Form, HTTPException, Request, UploadFile
 from fastapi.security import HTTPBearer
 from jose import JWTError
@@ -9,39 +12,163 @@ from app.schemas import Candidate, CandidateCreate, CandidatePayload
 from app.utils.utils import normalize_empty_strings
 from .db import get_db
 from . import models, security
-from .cache import cache_get, cache_set
+from .sessions import is_session_active, register_session, touch_session
+from .cache import add_delete_hook, cache_get, cache_set, cache_delete_many
+import fnmatch
 import hashlib
+import uuid
+from typing import Dict, Optional, Tuple
 
 
 security_scheme = HTTPBearer()
 
+TOKEN_CACHE_MAX_ITEMS = int(os.getenv('TOKEN_CACHE_MAX_ITEMS', '10000'))
 
-async def get_current_user(request: Request, token: str = Depends(security_scheme), db: AsyncSession = Depends(get_db)):
-    jwt_token = token.credentials
+SESSION_CACHE_PREFIX = "user_session:"
+
+
+def session_cache_key(token_hash: str) -> str:
+    return f"{SESSION_CACHE_PREFIX}{token_hash}"
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of raw token -> (claims, sha256 hash), kept until the token's exp,
+    so repeat requests skip the JWT signature check and the hashing.
+    """
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._data: "OrderedDict[str, Tuple[float, dict, str]]" = OrderedDict()
+        self._by_hash: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[Tuple[dict, str]]:
+        entry = self._data.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, claims, token_hash = entry
+        if expires_at <= time.time():
+            self._drop(token)
+            self.misses += 1
+            return None
+        self._data.move_to_end(token)
+        self.hits += 1
+        return claims, token_hash
+
+    def set(self, token: str, claims: dict, token_hash: str) -> None:
+        if not isinstance(claims.get('exp'), (int, float)):
+            return
+        self._data[token] = (float(claims['exp']), claims, token_hash)
+        self._data.move_to_end(token)
+        self._by_hash[token_hash] = token
+        while len(self._data) > self.max_items:
+            self._drop(next(iter(self._data)))
+
+    def forget(self, token_hash: str) -> None:
+        token = self._by_hash.get(token_hash)
+        if token is not None:
+            self._drop(token)
+
+    def forget_matching(self, pattern: str) -> None:
+        for token_hash in [h for h in self._by_hash if fnmatch.fnmatchcase(session_cache_key(h), pattern)]:
+            self.forget(token_hash)
+
+    def _drop(self, token: str) -> None:
+        _, _, token_hash = self._data.pop(token)
+        self._by_hash.pop(token_hash, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_verified_tokens = VerifiedTokenCache(TOKEN_CACHE_MAX_ITEMS)
+
+
+def _forget_deleted_sessions(keys: list, pattern: Optional[str]) -> None:
+    # Logout (here or on another worker) deletes the session key: drop its verified token too
+    for key in keys:
+        if key.startswith(SESSION_CACHE_PREFIX):
+            _verified_tokens.forget(key[len(SESSION_CACHE_PREFIX):])
+    if pattern:
+        _verified_tokens.forget_matching(pattern)
+
+
+add_delete_hook(_forget_deleted_sessions)
+
+
+def verify_token(jwt_token: str) -> Optional[Tuple[dict, str]]:
+    """Decoded claims and sha256 hash of a valid token (from the LRU when seen before), else None"""
+    cached = _verified_tokens.get(jwt_token)
+    if cached is not None:
+        return cached
     payload = security.decode_token(jwt_token)
     if not payload or 'sub' not in payload:
+        return None
+    token_hash = hashlib.sha256(jwt_token.encode()).hexdigest()
+    _verified_tokens.set(jwt_token, payload, token_hash)
+    return payload, token_hash
+
+
+def get_token_cache_stats() -> dict:
+    return {
+        "size": len(_verified_tokens),
+        "max_items": _verified_tokens.max_items,
+        "hits": _verified_tokens.hits,
+        "misses": _verified_tokens.misses,
+    }
+
+
+async def get_cached_session_user(jwt_token: str) -> Optional[dict]:
+    """
+    Cached user dict for a valid token whose session get_current_user has already
+    checked against the DB (and logout has not dropped), else None. No DB access.
+    """
+    verified = verify_token(jwt_token)
+    if verified is None:
+        return None
+    payload, token_hash = verified
+    cached_user = await cache_get(session_cache_key(token_hash))
+    if not cached_user or cached_user.get('id') != str(payload['sub']) or not cached_user.get('is_active'):
+        return None
+    return cached_user
+
+
+async def get_current_user(request: Request, token: str = Depends(security_scheme), db: AsyncSession = Depends(get_db)):
+    jwt_token = token.credentials
+    verified = verify_token(jwt_token)
+    if verified is None:
         raise HTTPException(status_code=401, detail='Invalid token')
+    payload, token_hash = verified
     user_id = payload['sub']
+    touch_session(token_hash)  # last_seen_at, flushed in batches
     
     # Check cache first
-    token_hash = hashlib.sha256(jwt_token.encode()).hexdigest()
-    cache_key = f"user_session:{token_hash}"
+    cache_key = session_cache_key(token_hash)
     cached_user = await cache_get(cache_key)
     
     if cached_user:
-        return models.User(**cached_user)
+        return _user_from_cache(cached_user)
     
-    # Single optimized query: JOIN user and session tables
-    stmt = await db.execute(
-        select(models.User)
-        .join(models.UserSession, models.User.id == models.UserSession.user_id)
-        .where(
-            models.UserSession.session_token_hash == token_hash,
-            models.UserSession.is_active == True,
-            models.User.id == user_id
+    if await is_session_active(token_hash, user_id):
+        # The session registry vouches for the session: only the user row is needed
+        user = await db.get(models.User, uuid.UUID(str(user_id)))
+    else:
+        # Not in the registry (Redis flushed or unavailable): single JOIN of user and session tables
+        stmt = await db.execute(
+            select(models.User)
+            .join(models.UserSession, models.User.id == models.UserSession.user_id)
+            .where(
+                models.UserSession.session_token_hash == token_hash,
+                models.UserSession.is_active == True,
+                models.User.id == user_id
+            )
         )
-    )
-    user = stmt.scalars().first()
+        user = stmt.scalars().first()
+        if user:
+            await register_session(token_hash, user.id, ttl=max(int(payload['exp'] - time.time()), 1))
     if not user:
         raise HTTPException(status_code=401, detail='Invalid session or user not found')
     
@@ -58,33 +185,44 @@ async def get_current_user(request: Request, token: str = Depends(security_schem
     
     return user
 
-async def get_current_user_hr(db: AsyncSession = Depends(get_db),current=Depends(get_current_user)):
-    stmt = await db.execute(select(models.User).where(models.User.id == current.id, models.User.role.in_([models.UserRoleEnum.hr_admin])))
-    allowed = stmt.scalars().first()
-    if not allowed:
-        raise HTTPException(status_code=403, detail='Not allowed')
-    return current
+def _user_from_cache(cached_user: dict) -> models.User:
+    return models.User(**{
+        **cached_user,
+        'id': uuid.UUID(cached_user['id']),
+        'role': models.UserRoleEnum(cached_user['role']) if cached_user.get('role') else None,
+    })
 
-async def get_current_user_team_manager(
-    db: AsyncSession = Depends(get_db),
-    current: models.User = Depends(get_current_user)
-):
+async def invalidate_user_sessions(db: AsyncSession, user_id) -> None:
     """
-    Allow access for HR admins and team leads (hiring managers).
+    Drop the cached sessions of a user so the next request reloads the user (and role)
+    from the DB. Cached sessions keep a user's role for up to 30 minutes, so whatever
+    changes a role or deactivates a user must call this after committing. No endpoint
+    does either yet; the users table is edited directly.
     """
-    stmt = await db.execute(
-        select(models.User).where(
-            models.User.id == current.id,
-            models.User.role.in_(
-                [models.UserRoleEnum.hr_admin, models.UserRoleEnum.team_lead]
-            ),
+    result = await db.execute(
+        select(models.UserSession.session_token_hash).where(
+            models.UserSession.user_id == user_id,
+            models.UserSession.is_active == True
         )
     )
-    allowed = stmt.scalars().first()
-    if not allowed:
+    await cache_delete_many([session_cache_key(h) for h in result.scalars().all()])
+
+# Role checks use the role loaded by get_current_user (cached session or the session
+# query), so they cost no extra DB round trip.
+def _require_role(current: models.User, *roles: models.UserRoleEnum) -> models.User:
+    if current.role not in roles:
         raise HTTPException(status_code=403, detail='Not allowed')
     return current
 
+async def get_current_user_hr(current=Depends(get_current_user)):
+    return _require_role(current, models.UserRoleEnum.hr_admin)
+
+async def get_current_user_team_manager(current: models.User = Depends(get_current_user)):
+    """
+    Allow access for HR admins and team leads (hiring managers).
+    """
+    return _require_role(current, models.UserRoleEnum.hr_admin, models.UserRoleEnum.team_lead)
+
 async def parse_new_candidate(
     candidate: str = Form(...),  # JSON string
     resume: UploadFile = File(...)
@@ -1,4 +1,225 @@
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+"""
+Rate limiting shared by every worker and node.
 
-limiter = Limiter(key_func=get_remote_address)
+Counters live in Redis and each check is a single atomic Lua call. The window
+is a sliding window approximated from two fixed windows: the current count plus
+the share of the previous window's count that still falls inside the sliding
+window. Clients are identified from X-Forwarded-For, as appended by nginx and
+the load balancer, not by the proxy address the socket comes from: behind a
+trusted proxy the client is the entry TRUSTED_PROXY_HOPS from the right.
+
+Two layers:
+- rate_limit_middleware: one budget per client across all routes
+  (RATE_LIMIT_DEFAULT). Each request spends its route's weight from ROUTE_COSTS,
+  so expensive endpoints use the budget up faster.
+- @limiter.limit("100/minute"): an extra per-route limit, e.g. on login.
+
+The script is sent once per Redis server (SCRIPT LOAD) and run by its SHA
+afterwards. When Redis is unavailable, requests are allowed (fail open). The limiter
+protects capacity; it is not an authorization check.
+"""
+
+import functools
+import ipaddress
+import logging
+import math
+import os
+import re
+import time
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from redis.exceptions import NoScriptError
+
+from .cache import CircuitOpenError, get_redis
+from .cache_memory import MemoryBackend, register_local_script, script_sha
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_DEFAULT = os.getenv("RATE_LIMIT_DEFAULT", "600/minute")
+# Proxies allowed to set X-Forwarded-For (IPs or CIDRs): nginx on this host. Requests from
+# any other address are keyed by their socket address.
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(p.strip(), strict=False)
+    for p in os.getenv("TRUSTED_PROXIES", "127.0.0.1/32,::1/128").split(",") if p.strip()
+]
+# X-Forwarded-For entries our own infrastructure appends after the client address.
+# GCP external LB -> nginx sends "<client>, <lb-ip>" and nginx appends the GFE address it
+# was connected from, so the client is 2 entries from the right end of "<client>, <lb-ip>, <gfe-ip>".
+# 0: walk the chain from the right and take the first address outside TRUSTED_PROXIES.
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "2"))
+# Units of the per-client budget a request costs; the longest matching path prefix wins
+ROUTE_COSTS = {
+    path.strip(): int(cost)
+    for path, cost in (item.split("=") for item in os.getenv(
+        "RATE_LIMIT_ROUTE_COSTS", "/reports=20,/candidates/batch-upload-resumes=50,/candidates/import-template=20"
+    ).split(",") if "=" in item)
+}
+_EXEMPT_PREFIXES = ("/health", "/docs", "/redoc", "/openapi.json")
+
+_UNITS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# KEYS: current window counter, previous window counter
+# ARGV: limit, window_ms, ms elapsed in the current window, cost
+# Returns {allowed (0/1), remaining, retry_after_ms}
+_SLIDING_WINDOW = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local elapsed = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local used = previous * (window - elapsed) / window + current
+if used + cost > limit then
+    local retry = window - elapsed
+    if previous > 0 then
+        retry = math.min(retry, math.ceil((used + cost - limit) * window / previous))
+    end
+    return {0, math.floor(limit - used), retry}
+end
+redis.call('INCRBY', KEYS[1], cost)
+redis.call('PEXPIRE', KEYS[1], window * 2)
+return {1, math.floor(limit - used - cost), 0}
+"""
+
+
+def _sliding_window_local(backend: MemoryBackend, keys: list, args: list) -> list:
+    limit, window, elapsed, cost = (float(a) for a in args)
+    current = float(backend.get_now(keys[0]) or 0)
+    previous = float(backend.get_now(keys[1]) or 0)
+    used = previous * (window - elapsed) / window + current
+    if used + cost > limit:
+        retry = window - elapsed
+        if previous > 0:
+            retry = min(retry, math.ceil((used + cost - limit) * window / previous))
+        return [0, math.floor(limit - used), int(retry)]
+    backend.set_now(keys[0], int(current + cost), ttl=window * 2 / 1000)
+    return [1, math.floor(limit - used - cost), 0]
+
+
+register_local_script(_SLIDING_WINDOW, _sliding_window_local)
+_SLIDING_WINDOW_SHA = script_sha(_SLIDING_WINDOW)
+
+
+async def _sliding_window(redis_client, keys: list, args: list) -> list:
+    try:
+        return await redis_client.evalsha(_SLIDING_WINDOW_SHA, len(keys), *keys, *args)
+    except NoScriptError:
+        # First call on this server, or its script cache was flushed (restart, failover)
+        await redis_client.script_load(_SLIDING_WINDOW)
+        return await redis_client.evalsha(_SLIDING_WINDOW_SHA, len(keys), *keys, *args)
+
+_stats = {"allowed": 0, "limited": 0, "errors": 0}
+
+
+def parse_rate(rate: str) -> Tuple[int, int]:
+    """"100/minute" or "20/5 minutes" -> (limit, window seconds)"""
+    match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d*)\s*(second|minute|hour|day)s?\s*", rate)
+    if not match:
+        raise ValueError(f"Invalid rate limit {rate!r}")
+    return int(match[1]), int(match[2] or 1) * _UNITS[match[3]]
+
+
+def _is_trusted(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXIES)
+
+
+def client_ip(request: Request) -> str:
+    """The client address: the right-most X-Forwarded-For hop not added by one of our proxies"""
+    peer = request.client.host if request.client else "unknown"
+    if not _is_trusted(peer):
+        return peer
+    hops: List[str] = [h.strip() for h in request.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+    if TRUSTED_PROXY_HOPS > 0:
+        # Entries left of the client's are whatever the client sent: never trust them.
+        # A shorter chain (e.g. straight to nginx) starts with the client.
+        if len(hops) > TRUSTED_PROXY_HOPS:
+            return hops[-TRUSTED_PROXY_HOPS - 1]
+        return hops[0] if hops else peer
+    for hop in reversed(hops):
+        if not _is_trusted(hop):
+            return hop
+    return hops[0] if hops else peer
+
+
+def route_cost(path: str) -> int:
+    matches = [prefix for prefix in ROUTE_COSTS if path == prefix or path.startswith(prefix.rstrip("/") + "/")]
+    return ROUTE_COSTS[max(matches, key=len)] if matches else 1
+
+
+class RateLimitResult:
+    def __init__(self, allowed: bool, limit: int, remaining: int, retry_after: float):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = max(remaining, 0)
+        self.retry_after = retry_after
+
+    def headers(self) -> dict:
+        headers = {"X-RateLimit-Limit": str(self.limit), "X-RateLimit-Remaining": str(self.remaining)}
+        if not self.allowed:
+            headers["Retry-After"] = str(max(math.ceil(self.retry_after), 1))
+        return headers
+
+
+class SlidingWindowLimiter:
+    async def hit(self, scope: str, client: str, rate: str, cost: int = 1) -> RateLimitResult:
+        """Spend `cost` units of `client`'s `rate` budget in `scope`"""
+        limit, window = parse_rate(rate)
+        now_ms = int(time.time() * 1000)
+        window_ms = window * 1000
+        index = now_ms // window_ms
+        prefix = f"ratelimit:{scope}:{client}"
+        try:
+            redis_client = await get_redis()
+            allowed, remaining, retry_ms = await _sliding_window(
+                redis_client, [f"{prefix}:{index}", f"{prefix}:{index - 1}"],
+                [limit, window_ms, now_ms - index * window_ms, cost],
+            )
+        except Exception as e:
+            _stats["errors"] += 1
+            # An open breaker is expected, not news: stay quiet instead of logging per request
+            if not isinstance(e, CircuitOpenError):
+                logger.warning(f"Rate limiter unavailable, allowing request: {e}")
+            return RateLimitResult(True, limit, limit, 0)
+        _stats["allowed" if allowed else "limited"] += 1
+        return RateLimitResult(bool(allowed), limit, int(remaining), int(retry_ms) / 1000)
+
+    def limit(self, rate: str, cost: int = 1):
+        """Endpoint decorator for a per-route limit; the endpoint must take `request: Request`"""
+        parse_rate(rate)  # fail at import time on a typo
+
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                request = kwargs.get("request") or next((a for a in args if isinstance(a, Request)), None)
+                if RATE_LIMIT_ENABLED and request is not None:
+                    result = await self.hit(f"{func.__module__}.{func.__name__}", client_ip(request), rate, cost)
+                    if not result.allowed:
+                        raise HTTPException(status_code=429, detail=f"Rate limit exceeded: {rate}", headers=result.headers())
+                return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+limiter = SlidingWindowLimiter()
+
+
+async def rate_limit_middleware(request: Request, call_next):
+    if not RATE_LIMIT_ENABLED or request.method == "OPTIONS" or request.url.path.startswith(_EXEMPT_PREFIXES):
+        return await call_next(request)
+    result = await limiter.hit("global", client_ip(request), RATE_LIMIT_DEFAULT, route_cost(request.url.path))
+    if not result.allowed:
+        return JSONResponse(status_code=429, content={"detail": f"Rate limit exceeded: {RATE_LIMIT_DEFAULT}"}, headers=result.headers())
+    response = await call_next(request)
+    response.headers.update(result.headers())
+    return response
+
+
+def get_rate_limit_stats() -> dict:
+    return {"enabled": RATE_LIMIT_ENABLED, "default": RATE_LIMIT_DEFAULT, "route_costs": ROUTE_COSTS, **_stats}
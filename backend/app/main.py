@@ -1,15 +1,22 @@
 import os
 import time
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
  
 from fastapi.concurrency import asynccontextmanager
 from .routers import auth,candidates,reports,dashboard, get_candidates, employees, teams, projects, attendance, users
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-from slowapi.errors import RateLimitExceeded
-from slowapi import _rate_limit_exceeded_handler
-from .limiter import limiter
-from .cache import close_redis
+from .limiter import rate_limit_middleware, get_rate_limit_stats
+from .security import PasswordHashingBusy, get_hashing_stats
+from .deps import get_token_cache_stats
+from .sessions import flush_last_seen, get_session_stats
+from .read_routing import read_your_writes_middleware, register_replica_lag_job, get_read_routing_stats
+from .cache import close_redis, start_cache_invalidation_listener, stop_cache_invalidation_listener
+from .scheduler import start_scheduler, stop_scheduler, get_scheduler_status
+from . import dashboard_views
+from .response_cache import response_cache_middleware
+from .warmup import start_warmup, stop_warmup, is_warm, get_warmup_status
 from .logging_setup import setup_logging, install_logging, get_logger
 
 # ---- Setup logging first ----
@@ -32,9 +39,26 @@ async def lifespan(app: FastAPI):
     # Startup
     logger = get_logger("app")
     logger.info("Application startup initiated")
+    if dashboard_views.DASHBOARD_VIEWS_ENABLED:
+        try:
+            await dashboard_views.ensure_dashboard_views()
+            dashboard_views.register_refresh_job()
+        except Exception as e:
+            logger.error(f"Dashboard views unavailable: {e}")
+    await start_cache_invalidation_listener()
+    register_replica_lag_job()
+    await start_scheduler()
+    start_warmup()
     yield
     # Shutdown
     logger.info("Application shutdown initiated")
+    await stop_warmup()
+    await stop_scheduler()
+    try:
+        await flush_last_seen()
+    except Exception as e:
+        logger.error(f"Final last_seen_at flush failed: {e}")
+    await stop_cache_invalidation_listener()
     await close_redis()
 
 app = FastAPI(
@@ -57,9 +81,10 @@ install_logging(app)
 
  
 
-# Add rate limiter to app
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+@app.exception_handler(PasswordHashingBusy)
+async def password_hashing_busy_handler(request: Request, exc: PasswordHashingBusy):
+    # Shed login/register bursts early rather than queueing them behind bcrypt
+    return JSONResponse(status_code=503, content={"detail": "Authentication is busy, please retry"}, headers={"Retry-After": "1"})
 
 # Set CORS_ORIGINS in your .env file: CORS_ORIGINS=http://localhost:3000,http://34.80.84.47
 # For production behind nginx, you can use "*" to allow all origins, or specify exact IPs/domains
@@ -71,6 +96,12 @@ if cors_origins_env == "*":
 else:
     origins = [origin.strip().rstrip("/") for origin in cors_origins_env.split(",") if origin.strip()]
 
+# Response cache sits inside GZip: hits carry their own gzip body, misses are compressed as usual
+app.middleware("http")(response_cache_middleware)
+# Rate limit outside the response cache so cache hits spend budget too (Redis-backed, see app/limiter.py)
+app.middleware("http")(rate_limit_middleware)
+# Remembers who just wrote, so their next reads skip the replica (app/read_routing.py)
+app.middleware("http")(read_your_writes_middleware)
 app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 @app.middleware("http")
@@ -118,20 +149,59 @@ async def root():
 @app.get("/health", tags=["home"], summary="Health check with DB", response_description="Service and database status")
 async def health_check():
     """Health check endpoint that verifies database connectivity"""
-    from .db import check_db_connection, get_pool_status
+    from .db import check_db_connection, get_pool_status, get_replica_pool_status
+    from .cache import get_cache_stats
     
     db_healthy = await check_db_connection()
     pool_status = await get_pool_status()
+    replica_pool_status = await get_replica_pool_status()
     
     if db_healthy:
         return {
             "status": "healthy",
             "database": "connected",
-            "pool": pool_status
+            "pool": pool_status,
+            "replica_pool": replica_pool_status,
+            "scheduler": get_scheduler_status(),
+            "cache": await get_cache_stats(),
+            "warmup": get_warmup_status(),
+            "password_hashing": get_hashing_stats(),
+            "token_cache": get_token_cache_stats(),
+            "sessions": get_session_stats(),
+            "rate_limit": get_rate_limit_stats(),
+            "read_routing": get_read_routing_stats()
         }
     else:
         return {
             "status": "unhealthy",
             "database": "disconnected",
-            "pool": pool_status
-        }
\ No newline at end of file
+            "pool": pool_status,
+            "replica_pool": replica_pool_status,
+            "scheduler": get_scheduler_status(),
+            "cache": await get_cache_stats(),
+            "warmup": get_warmup_status(),
+            "password_hashing": get_hashing_stats(),
+            "token_cache": get_token_cache_stats(),
+            "sessions": get_session_stats(),
+            "rate_limit": get_rate_limit_stats(),
+            "read_routing": get_read_routing_stats()
+        }
+
+@app.get("/health/live", tags=["home"], summary="Liveness", response_description="The process is up")
+async def liveness():
+    """Liveness: no dependencies checked, so a slow DB never gets the worker restarted"""
+    return {"status": "alive"}
+
+@app.get("/health/ready", tags=["home"], summary="Readiness", response_description="Database reachable and caches warmed")
+async def readiness():
+    """Readiness: 503 until the database answers and startup cache warm-up has finished"""
+    from .db import check_db_connection
+
+    db_healthy = await check_db_connection()
+    ready = db_healthy and is_warm()
+    body = {
+        "status": "ready" if ready else "not_ready",
+        "database": "connected" if db_healthy else "disconnected",
+        "warmup": get_warmup_status()
+    }
+    return JSONResponse(status_code=200 if ready else 503, content=body)
@@ -70,6 +70,20 @@ class UserSession(Base):
     is_active = Column(Boolean, default=True)
 
 
+# Issued refresh tokens (see /auth/refresh). A family is one login and all of its
+# rotations: each token may be used once, and a reused one revokes the whole family.
+class RefreshToken(Base):
+    __tablename__ = 'refresh_tokens'
+    jti = Column(UUID(as_uuid=True), primary_key=True)
+    family_id = Column(UUID(as_uuid=True), nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    session_token_hash = Column(String, nullable=False)  # access session issued alongside
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    used_at = Column(DateTime(timezone=True), nullable=True)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
+
+
 class Candidates(Base):
     __tablename__ = "candidates"
 
@@ -125,6 +139,44 @@ class CandidateStages(Base):
 
 
 
+# Time-in-stage sketch: log-scale histogram of closed stage durations per local day
+# (maintained by app.rollups on every stage transition; rebuild with `python -m app.rollups rebuild`)
+class StageDurationRollup(Base):
+    __tablename__ = 'candidate_stage_duration_rollup'
+    day = Column(Date, primary_key=True)  # local (Asia/Jakarta) day the stage closed
+    stage_key: CandidateStatusEnum = Column(Enum(CandidateStatusEnum,name="candidate_status",create_type=False),primary_key=True)  # type: ignore[assignment, var-annotated]
+    bucket = Column(Integer, primary_key=True)  # ceil(log_gamma(duration_seconds))
+    count = Column(BigInteger, nullable=False, default=0)
+
+
+# Stage counts per (grain, local bucket, stage_label) for /dashboard/candidate-stages.
+# `transitions` counts every stage entered in the bucket; `latest` counts candidates whose
+# latest stage within the bucket has that label (not additive across days, hence one row set per grain).
+class StageCountRollup(Base):
+    __tablename__ = 'candidate_stage_count_rollup'
+    grain = Column(String(8), primary_key=True)  # day / week / month / year / all
+    bucket_start = Column(Date, primary_key=True)  # local (Asia/Jakarta) start of the bucket
+    stage_label = Column(String(50), primary_key=True)  # stage_key, or rejection reason for rejected
+    transitions = Column(BigInteger, nullable=False, default=0)
+    latest = Column(BigInteger, nullable=False, default=0)
+
+
+# Last full rebuild of each rollup (see app.rollups). Written in the rebuild's transaction:
+# a rollup without a row here only holds incremental deltas and is not read.
+class RollupRebuild(Base):
+    __tablename__ = 'rollup_rebuilds'
+    rollup_name = Column(String(50), primary_key=True)
+    rebuilt_at = Column(DateTime(timezone=True), nullable=False)
+
+
+# Last refresh of each dashboard materialized view (see app.dashboard_views)
+class DashboardViewRefresh(Base):
+    __tablename__ = 'dashboard_view_refreshes'
+    view_name = Column(String(100), primary_key=True)
+    refreshed_at = Column(DateTime(timezone=True), nullable=False)
+    duration_ms = Column(Integer, nullable=True)
+
+
 # Employee 
 class Employee(Base):
     __tablename__ = "employee" 
@@ -222,6 +274,31 @@ Index('idx_candidates_date_scraped', Candidates.date_scraped)
 Index('idx_candidates_status', Candidates.candidate_status)  # type: ignore[arg-type]
 Index('idx_user_sessions_token', UserSession.session_token_hash)
 Index('idx_user_sessions_active', UserSession.is_active)
+# create_all only builds indexes together with a new table: on an existing database run the
+# CREATE INDEX (CONCURRENTLY) for idx_user_sessions_user_active and idx_candidate_stages_* by hand.
+# Active sessions of a user: login's single-session UPDATE and invalidate_user_sessions
+Index(
+    'idx_user_sessions_user_active',
+    UserSession.user_id,
+    UserSession.is_active,
+    postgresql_where=UserSession.is_active == True,
+)
+
+Index('idx_refresh_tokens_family', RefreshToken.family_id)
+Index('idx_refresh_tokens_session', RefreshToken.session_token_hash)
+Index('idx_refresh_tokens_user_live', RefreshToken.user_id, postgresql_where=RefreshToken.revoked_at.is_(None))
+Index('idx_refresh_tokens_expires', RefreshToken.expires_at)
+
+# Candidate stage history: latest-stage lookups and the dashboard's lag() window
+Index('idx_candidate_stages_candidate_entered', CandidateStages.candidate_id, CandidateStages.entered_at.desc())
+# Open stage per candidate (exited_at IS NULL); INCLUDE makes it index-only for stages.open_stages_select()
+Index(
+    'idx_candidate_stages_open',
+    CandidateStages.candidate_id,
+    CandidateStages.entered_at.desc(),
+    postgresql_where=CandidateStages.exited_at.is_(None),
+    postgresql_include=['id', 'stage_key'],
+)
 
 # ✅ ADD: New indexes for employee_project_task
 Index('idx_employee_project_task_employee', EmployeeProjectTask.employee_uuid)
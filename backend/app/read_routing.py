@@ -0,0 +1,183 @@
+"""
+Read-replica routing (DATABASE_REPLICA_URL).
+
+get_read_db is get_db for read-only routes. It returns a replica session when all of these hold:
+- the replica answered its last lag check (every REPLICA_LAG_CHECK_SECONDS);
+- its replay lag was under REPLICA_MAX_LAG_SECONDS;
+- the caller has not written anything in the last READ_YOUR_WRITES_SECONDS;
+- no cache namespace was invalidated or marked stale in the last READ_YOUR_WRITES_SECONDS.
+Otherwise it returns a primary session. Writes are remembered per user in Redis
+by read_your_writes_middleware, so the stickiness holds whichever worker or node
+serves the next read. The last rule keeps shared caches honest: the recompute or
+cache fill that follows an invalidation is seen by every user, so it must not be
+loaded from a replica that has not replayed the write yet. A replica that cannot hand out a connection is marked down
+until the next successful check, and the read goes to the primary.
+
+Without DATABASE_REPLICA_URL everything reads from the primary, as before.
+"""
+
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import Request
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .cache import LAST_INVALIDATION_KEY, get_redis
+from .db import AsyncSessionLocal, ReplicaAsyncSessionLocal, replica_engine
+from .scheduler import register_job
+
+logger = logging.getLogger(__name__)
+
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', '5'))
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv('REPLICA_LAG_CHECK_SECONDS', '5'))
+# Must cover the lag the replica is allowed to have
+READ_YOUR_WRITES_SECONDS = int(os.getenv('READ_YOUR_WRITES_SECONDS', str(int(REPLICA_MAX_LAG_SECONDS * 2))))
+
+_SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_LAG_QUERY = text("""
+select case
+    when not pg_is_in_recovery() then 0
+    when pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() then 0
+    else coalesce(extract(epoch from now() - pg_last_xact_replay_timestamp()), 0)
+end
+""")
+
+_replica = {"healthy": False, "lag_seconds": None, "checked_at": None, "last_error": None}
+_stats = {"replica_reads": 0, "primary_reads": 0, "sticky_reads": 0, "post_invalidation_reads": 0, "fallbacks": 0}
+
+
+def _mark_replica_down(error: Exception) -> None:
+    _replica.update(healthy=False, last_error=str(error))
+    _stats["fallbacks"] += 1
+    logger.warning(f"Read replica unavailable, reading from the primary: {error}")
+
+
+async def check_replica_lag() -> None:
+    """Scheduler job (every worker): measure replay lag and decide whether the replica is usable."""
+    try:
+        async with replica_engine.connect() as conn:
+            lag = float((await conn.execute(_LAG_QUERY)).scalar() or 0)
+    except Exception as e:
+        if _replica["healthy"]:
+            _mark_replica_down(e)
+        _replica.update(healthy=False, lag_seconds=None, checked_at=time.time(), last_error=str(e))
+        return
+    if lag > REPLICA_MAX_LAG_SECONDS:
+        logger.warning(f"Read replica lagging {lag:.1f}s (max {REPLICA_MAX_LAG_SECONDS}s), reading from the primary")
+    _replica.update(healthy=lag <= REPLICA_MAX_LAG_SECONDS, lag_seconds=round(lag, 3), checked_at=time.time(), last_error=None)
+
+
+def register_replica_lag_job() -> None:
+    if replica_engine is not None:
+        register_job("replica_lag_check", REPLICA_LAG_CHECK_SECONDS, check_replica_lag, exclusive=False)
+
+
+def replica_usable() -> bool:
+    return replica_engine is not None and _replica["healthy"]
+
+
+def _write_marker_key(user_id: str) -> str:
+    return f"ryw:{user_id}"
+
+
+def _caller_id(request: Request) -> Optional[str]:
+    from .deps import verify_token
+
+    auth = request.headers.get("authorization", "")
+    verified = verify_token(auth[7:]) if auth.lower().startswith("bearer ") else None
+    return str(verified[0]["sub"]) if verified else None
+
+
+async def _primary_reason(request: Optional[Request]) -> Optional[str]:
+    """Why this read must go to the primary ("sticky_reads" / "post_invalidation_reads"), or None"""
+    user_id = _caller_id(request) if request is not None else None
+    keys = [LAST_INVALIDATION_KEY] + ([_write_marker_key(user_id)] if user_id is not None else [])
+    try:
+        redis_client = await get_redis()
+        invalidated_at, *wrote = await redis_client.mget(keys)
+    except Exception:
+        return "sticky_reads"  # cannot tell: stay consistent and read the primary
+    if wrote and wrote[0]:
+        return "sticky_reads"
+    if invalidated_at and time.time() - float(invalidated_at) < READ_YOUR_WRITES_SECONDS:
+        return "post_invalidation_reads"
+    return None
+
+
+async def _open_replica_session() -> Optional[AsyncSession]:
+    session = ReplicaAsyncSessionLocal()
+    try:
+        await session.connection()  # checkout now, so a dead replica falls back before the query
+        return session
+    except (SQLAlchemyError, OSError) as e:
+        await session.close()
+        _mark_replica_down(e)
+        return None
+
+
+async def _read_session(request: Optional[Request]) -> AsyncSession:
+    if replica_usable():
+        reason = await _primary_reason(request)
+        if reason is not None:
+            _stats[reason] += 1
+        else:
+            session = await _open_replica_session()
+            if session is not None:
+                _stats["replica_reads"] += 1
+                return session
+    _stats["primary_reads"] += 1
+    return AsyncSessionLocal()
+
+
+async def get_read_db(request: Request):
+    """get_db for read-only routes: the replica when it is safe to read there, else the primary"""
+    session = None
+    try:
+        session = await _read_session(request)
+        yield session
+    except SQLAlchemyError as e:
+        if session:
+            await session.rollback()
+        logger.error(f"Database error: {str(e)}")
+        raise
+    except Exception as e:
+        if session:
+            await session.rollback()
+        logger.error(f"Unexpected error in get_read_db: {str(e)}")
+        raise
+    finally:
+        if session:
+            await session.close()
+
+
+@asynccontextmanager
+async def read_session():
+    """Read-only session outside a request (background recomputes): replica if usable and nothing was just invalidated"""
+    session = await _read_session(None)
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+async def read_your_writes_middleware(request: Request, call_next):
+    response = await call_next(request)
+    if replica_engine is not None and request.method not in _SAFE_METHODS:
+        user_id = _caller_id(request)
+        if user_id is not None:
+            try:
+                redis_client = await get_redis()
+                await redis_client.set(_write_marker_key(user_id), "1", ex=READ_YOUR_WRITES_SECONDS)
+            except Exception as e:
+                logger.warning(f"Could not record write for read-your-writes: {e}")
+    return response
+
+
+def get_read_routing_stats() -> dict:
+    return {"replica_configured": replica_engine is not None, "replica": dict(_replica), **_stats}
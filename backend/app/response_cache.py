@@ -0,0 +1,163 @@
+"""
+Route-level HTTP response cache.
+
+GET responses of the routes in CACHED_ROUTES are stored gzip-compressed in the
+cache, keyed by path, normalized query string, the caller's role and the current
+version of each of the route's tags. A hit is answered straight from the
+middleware: no routing, no dependencies, no DB, no serialization.
+
+Only callers whose session is already in the session cache (see
+deps.get_cached_session_user) can be served from it; anyone else goes through
+the normal auth path. Write endpoints declare the tags they make stale with
+@invalidates_tags(...), which bumps the tag versions (the same versions
+cache_result namespaces use), so old entries are never read again.
+"""
+
+import functools
+import gzip
+import hashlib
+import json
+import os
+import re
+from typing import Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from .cache import READ_CACHE_TTL, cache_invalidate_namespace, cache_namespace_versions, get_redis
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Response headers that describe the stored body rather than the transfer
+_SKIPPED_HEADERS = {"content-length", "content-encoding", "transfer-encoding", "set-cookie", "vary"}
+
+
+def _storable(response) -> bool:
+    cache_control = response.headers.get("cache-control", "").lower()
+    return (
+        response.status_code == 200
+        and "set-cookie" not in response.headers
+        and "no-store" not in cache_control
+        and "private" not in cache_control
+    )
+
+
+class CachedRoute:
+    def __init__(self, template: str, ttl: int, tags: Iterable[str]):
+        self.template = template
+        self.ttl = ttl
+        self.tags = tuple(tags)
+        self.pattern = re.compile("^" + re.sub(r"\{[^/]+\}", "[^/]+", template) + "$")
+
+
+CACHED_ROUTES: List[CachedRoute] = [
+    CachedRoute("/teams/with-details", READ_CACHE_TTL, tags=("employees", "projects")),
+    CachedRoute("/employees/teams/{team_name}/projects", READ_CACHE_TTL, tags=("employees", "projects")),
+    # Short TTL: the dashboard itself is already served stale-while-revalidate
+    CachedRoute("/dashboard/candidate-stages", 60, tags=("candidate_stages",)),
+]
+
+_stats = {"hits": 0, "misses": 0, "stored": 0, "bypassed": 0}
+
+
+def _match(path: str) -> Optional[CachedRoute]:
+    for route in CACHED_ROUTES:
+        if route.pattern.match(path):
+            return route
+    return None
+
+
+def _normalized_query(query: str) -> str:
+    return urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+
+
+async def _cache_key(request: Request, route: CachedRoute, role: str) -> str:
+    versions = await cache_namespace_versions(route.tags)
+    raw = "|".join([
+        request.url.path,
+        _normalized_query(request.url.query),
+        role,
+        ",".join(f"{tag}={v}" for tag, v in zip(route.tags, versions)),
+    ])
+    return "http_cache:" + hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def _pack(status: int, headers: List[Tuple[str, str]], body: bytes) -> bytes:
+    meta = json.dumps({"status": status, "headers": headers}).encode()
+    return meta + b"\n" + gzip.compress(body, compresslevel=6)
+
+
+def _unpack(raw: bytes) -> Tuple[int, List[Tuple[str, str]], bytes]:
+    meta, gz_body = raw.split(b"\n", 1)
+    info = json.loads(meta)
+    return info["status"], info["headers"], gz_body
+
+
+async def response_cache_middleware(request: Request, call_next):
+    route = _match(request.url.path) if RESPONSE_CACHE_ENABLED and request.method == "GET" else None
+    if route is None:
+        return await call_next(request)
+
+    from .deps import get_cached_session_user
+
+    auth = request.headers.get("authorization", "")
+    user = await get_cached_session_user(auth[7:]) if auth.lower().startswith("bearer ") else None
+    if user is None or "no-cache" in request.headers.get("cache-control", ""):
+        _stats["bypassed"] += 1
+        return await call_next(request)
+
+    try:
+        redis_client = await get_redis()
+        key = await _cache_key(request, route, user.get("role") or "")
+        raw = await redis_client.get(key)
+    except Exception:
+        _stats["bypassed"] += 1
+        return await call_next(request)
+
+    if raw:
+        _stats["hits"] += 1
+        status, headers, gz_body = _unpack(raw)
+        if "gzip" in request.headers.get("accept-encoding", ""):
+            response = Response(content=gz_body, status_code=status)
+            response.headers["content-encoding"] = "gzip"
+        else:
+            response = Response(content=gzip.decompress(gz_body), status_code=status)
+        for name, value in headers:
+            response.headers[name] = value
+        response.headers["vary"] = "Accept-Encoding, Authorization"
+        response.headers["x-cache"] = "HIT"
+        return response
+
+    _stats["misses"] += 1
+    response = await call_next(request)
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    if _storable(response):
+        headers = [(k, v) for k, v in response.headers.items() if k.lower() not in _SKIPPED_HEADERS]
+        try:
+            await redis_client.setex(key, route.ttl, _pack(response.status_code, headers, body))
+            _stats["stored"] += 1
+        except Exception:
+            pass
+    # The live response keeps every header it had (set-cookie, vary, repeated headers)
+    fresh = Response(content=body, status_code=response.status_code)
+    fresh.raw_headers = list(response.raw_headers)
+    fresh.headers["x-cache"] = "MISS"
+    return fresh
+
+
+def invalidates_tags(*tags: str):
+    """Endpoint decorator: once the endpoint succeeds, bump the given tag versions"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            result = await func(*args, **kwargs)
+            for tag in tags:
+                await cache_invalidate_namespace(tag)
+            return result
+        return wrapper
+    return decorator
+
+
+def get_response_cache_stats() -> dict:
+    return {"enabled": RESPONSE_CACHE_ENABLED, **_stats}
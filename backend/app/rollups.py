@@ -0,0 +1,364 @@
+"""
+Incrementally maintained rollups over candidate stage history.
+
+Time-in-stage is kept as a log-scale histogram (a DDSketch-style sketch) per
+(local day, stage, bucket): a closed stage of `d` seconds lands in bucket
+ceil(log_gamma(d)), so any quantile read back from the buckets is within
+SKETCH_RELATIVE_ACCURACY of the true value. Rows are upserted on each stage
+transition; readers sum a handful of rows instead of scanning `candidate_stages`.
+
+Stage counts for the dashboard are kept per (grain, local bucket, stage label)
+for every grain the dashboard can ask for, so a period query sums a bounded
+number of rows no matter how long the history is.
+
+Rebuild from history (e.g. after a backfill):
+
+    python -m app.rollups rebuild
+
+Each rebuild records itself in rollup_rebuilds in the same transaction. The
+rollup_backfill job runs the rebuild once, on one worker, while that record is
+missing (first deploy, including on an existing database); until then readers
+fall back to the live queries (see stage_counts_backfilled).
+"""
+
+import asyncio
+import logging
+import math
+import os
+import sys
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+import pytz
+from sqlalchemy import BigInteger, Date, Integer, String, Text, bindparam, case, cast, delete, func, literal, select, text, type_coerce
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .scheduler import register_job
+
+logger = logging.getLogger(__name__)
+
+TZ_NAME = "Asia/Jakarta"  # same local day as the dashboard buckets
+LOCAL_TZ = pytz.timezone(TZ_NAME)
+
+# Grains of the stage-count rollup; "all" has a single bucket (1970-01-01)
+GRAINS = ("day", "week", "month", "year", "all")
+ALL_TIME_BUCKET = date(1970, 1, 1)
+
+# Changing the accuracy changes bucket boundaries: run `rebuild` afterwards.
+SKETCH_RELATIVE_ACCURACY = 0.01
+SKETCH_GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+_LN_GAMMA = math.log(SKETCH_GAMMA)
+
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+
+# A failed backfill is retried on the next check
+ROLLUP_BACKFILL_CHECK_SECONDS = float(os.getenv("ROLLUP_BACKFILL_CHECK_SECONDS", "300"))
+
+
+def _sketch_bucket_expr(duration_col):
+    # durations below 1s share bucket 0
+    return cast(func.ceil(func.ln(func.greatest(duration_col, 1)) / _LN_GAMMA), Integer)
+
+
+def sketch_bucket_value(bucket: int) -> float:
+    """Representative duration (seconds) of a sketch bucket."""
+    return 2 * SKETCH_GAMMA ** bucket / (SKETCH_GAMMA + 1)
+
+
+def sketch_quantiles(bins: Dict[int, int], quantiles: Sequence[float] = DEFAULT_QUANTILES) -> Dict[float, Optional[float]]:
+    """Quantiles (seconds) from {bucket: count}. None when the sketch is empty."""
+    total = sum(bins.values())
+    if total <= 0:
+        return {q: None for q in quantiles}
+    ordered = sorted(bins.items())
+    out: Dict[float, Optional[float]] = {}
+    for q in quantiles:
+        rank = q * (total - 1)
+        seen = 0
+        for bucket, cnt in ordered:
+            seen += cnt
+            if seen > rank:
+                out[q] = round(sketch_bucket_value(bucket), 1)
+                break
+    return out
+
+
+# ==================== DURATION SKETCH ====================
+
+def _duration_upsert(source):
+    """Upsert grouped sketch counts from `source` (columns: day, stage_key, duration_seconds)."""
+    table = models.StageDurationRollup.__table__
+    bucket = _sketch_bucket_expr(source.c.duration_seconds)
+    grouped = (
+        select(source.c.day, source.c.stage_key, bucket, func.count())
+        .group_by(source.c.day, source.c.stage_key, bucket)
+    )
+    stmt = pg_insert(table).from_select(["day", "stage_key", "bucket", "count"], grouped)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.day, table.c.stage_key, table.c.bucket],
+        set_={"count": table.c.count + stmt.excluded.count},
+    )
+
+
+async def record_closed_stages(db: AsyncSession, closed: Iterable[Tuple[models.CandidateStatusEnum, Optional[int]]]) -> None:
+    """
+    Add stages that were just closed (exited now) to the duration sketch.
+    `closed` yields (stage_key, duration_seconds). Runs in the caller's transaction.
+    """
+    rows = [(stage, duration) for stage, duration in closed if stage is not None and duration is not None]
+    if not rows:
+        return
+    stage_type = models.StageDurationRollup.__table__.c.stage_key.type
+    closed_rows = (
+        func.unnest(
+            cast(bindparam("stage_keys", type_=ARRAY(Text)), ARRAY(Text)),
+            cast(bindparam("durations", type_=ARRAY(BigInteger)), ARRAY(BigInteger)),
+        )
+        .table_valued("stage_key", "duration_seconds")
+        .render_derived(name="closed_stages")
+    )
+    source = select(
+        cast(func.timezone(TZ_NAME, func.now()), Date).label("day"),
+        cast(closed_rows.c.stage_key, stage_type).label("stage_key"),
+        closed_rows.c.duration_seconds,
+    ).subquery("closed")
+    await db.execute(_duration_upsert(source), {
+        "stage_keys": [stage.value for stage, _ in rows],
+        "durations": [int(duration) for _, duration in rows],
+    })
+
+
+async def rebuild_stage_durations(db: AsyncSession) -> None:
+    """Recompute the duration sketch from every closed stage."""
+    cs = models.CandidateStages
+    source = (
+        select(
+            cast(func.timezone(TZ_NAME, cs.exited_at), Date).label("day"),
+            cs.stage_key.label("stage_key"),
+            cs.duration_seconds.label("duration_seconds"),
+        )
+        .where(cs.exited_at.isnot(None), cs.duration_seconds.isnot(None))
+        .subquery("closed")
+    )
+    # Transitions committing meanwhile wait and land on top of the rebuilt rows
+    await db.execute(text("LOCK TABLE candidate_stage_duration_rollup IN EXCLUSIVE MODE"))
+    await db.execute(delete(models.StageDurationRollup))
+    await db.execute(_duration_upsert(source))
+    await _record_rebuild(db, "stage_durations")
+
+
+# ==================== STAGE COUNTS ====================
+
+def stage_label(stage_key: models.CandidateStatusEnum, prev_key: Optional[models.CandidateStatusEnum]) -> str:
+    """Python twin of stage_label_expr()."""
+    if stage_key == models.CandidateStatusEnum.rejected:
+        if prev_key == models.CandidateStatusEnum.coding_test:
+            return "fail_coding_test"
+        if prev_key == models.CandidateStatusEnum.interview_team_lead:
+            return "fail_interview_lead"
+        # TODO: add fail_to_attend mapping when you have a signal
+        return "unqualified"
+    return stage_key.value
+
+
+def stage_label_expr(stage_col, prev_col):
+    """Dashboard label: the stage key, or for rejections a reason derived from the previous stage."""
+    # lag() carries no type; give it the enum type so the comparisons bind as candidate_status
+    prev_col = type_coerce(prev_col, models.CandidateStages.stage_key.type)
+    rejection_reason = case(
+        (prev_col == models.CandidateStatusEnum.coding_test, literal("fail_coding_test")),
+        (prev_col == models.CandidateStatusEnum.interview_team_lead, literal("fail_interview_lead")),
+        # TODO: add fail_to_attend mapping when you have a signal
+        else_=literal("unqualified"),
+    )
+    return case(
+        (stage_col == models.CandidateStatusEnum.rejected, rejection_reason),
+        else_=cast(stage_col, String),
+    )
+
+
+def bucket_start(grain: str, ts: datetime) -> date:
+    """Local bucket start of `ts` for a grain (matches Postgres date_trunc; weeks start Monday)."""
+    local = ts.astimezone(LOCAL_TZ).date() if ts.tzinfo else ts.date()
+    if grain == "day":
+        return local
+    if grain == "week":
+        return local - timedelta(days=local.weekday())
+    if grain == "month":
+        return local.replace(day=1)
+    if grain == "year":
+        return local.replace(month=1, day=1)
+    return ALL_TIME_BUCKET
+
+
+async def record_stage_transitions(db: AsyncSession, moves: Iterable[Dict[str, Any]]) -> None:
+    """
+    Fold freshly inserted stages into the stage-count rollup. Each move carries:
+      stage_key, entered_at                         - the new stage
+      latest_stage, latest_entered_at, latest_prev  - the candidate's latest stage before it (if any)
+    The new stage becomes the candidate's latest in its buckets; where the old latest
+    falls in the same bucket its label is moved out.
+    """
+    deltas: Dict[Tuple[str, date, str], list] = defaultdict(lambda: [0, 0])  # [transitions, latest]
+    for m in moves:
+        new_label = stage_label(m["stage_key"], m["latest_stage"])
+        old_label = stage_label(m["latest_stage"], m["latest_prev"]) if m["latest_stage"] is not None else None
+        for grain in GRAINS:
+            b = bucket_start(grain, m["entered_at"])
+            deltas[(grain, b, new_label)][0] += 1
+            deltas[(grain, b, new_label)][1] += 1
+            if old_label is not None and bucket_start(grain, m["latest_entered_at"]) == b:
+                deltas[(grain, b, old_label)][1] -= 1
+    if not deltas:
+        return
+
+    table = models.StageCountRollup.__table__
+    rows = (
+        func.unnest(
+            cast(bindparam("grains", type_=ARRAY(Text)), ARRAY(Text)),
+            cast(bindparam("buckets", type_=ARRAY(Date)), ARRAY(Date)),
+            cast(bindparam("labels", type_=ARRAY(Text)), ARRAY(Text)),
+            cast(bindparam("transitions", type_=ARRAY(BigInteger)), ARRAY(BigInteger)),
+            cast(bindparam("latest", type_=ARRAY(BigInteger)), ARRAY(BigInteger)),
+        )
+        .table_valued("grain", "bucket_start", "stage_label", "transitions", "latest")
+        .render_derived(name="deltas")
+    )
+    stmt = pg_insert(table).from_select(
+        ["grain", "bucket_start", "stage_label", "transitions", "latest"],
+        select(rows.c.grain, rows.c.bucket_start, rows.c.stage_label, rows.c.transitions, rows.c.latest),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.grain, table.c.bucket_start, table.c.stage_label],
+        set_={
+            "transitions": table.c.transitions + stmt.excluded.transitions,
+            "latest": table.c.latest + stmt.excluded.latest,
+        },
+    )
+    keys = list(deltas)
+    await db.execute(stmt, {
+        "grains": [k[0] for k in keys],
+        "buckets": [k[1] for k in keys],
+        "labels": [k[2] for k in keys],
+        "transitions": [deltas[k][0] for k in keys],
+        "latest": [deltas[k][1] for k in keys],
+    })
+
+
+async def rebuild_stage_counts(db: AsyncSession) -> None:
+    """Recompute the stage-count rollup for every grain from the full stage history."""
+    cs = models.CandidateStages
+    prev_stage = func.lag(cs.stage_key).over(
+        partition_by=cs.candidate_id,
+        order_by=cs.entered_at.asc(),
+    )
+    labelled = select(
+        cs.candidate_id,
+        cs.entered_at,
+        func.timezone(TZ_NAME, cs.entered_at).label("local_ts"),
+        stage_label_expr(cs.stage_key, prev_stage).label("stage_label"),
+    ).subquery("labelled")
+
+    await db.execute(text("LOCK TABLE candidate_stage_count_rollup IN EXCLUSIVE MODE"))
+    await db.execute(delete(models.StageCountRollup))
+    for grain in GRAINS:
+        if grain == "all":
+            bucket = cast(literal(ALL_TIME_BUCKET), Date)
+        else:
+            bucket = cast(func.date_trunc(grain, labelled.c.local_ts), Date)
+        ranked = select(
+            bucket.label("bucket_start"),
+            labelled.c.stage_label,
+            func.row_number().over(
+                partition_by=(labelled.c.candidate_id, bucket),
+                order_by=labelled.c.entered_at.desc(),
+            ).label("rn"),
+        ).subquery("ranked")
+        await db.execute(
+            pg_insert(models.StageCountRollup.__table__).from_select(
+                ["grain", "bucket_start", "stage_label", "transitions", "latest"],
+                select(
+                    literal(grain, String),
+                    ranked.c.bucket_start,
+                    ranked.c.stage_label,
+                    func.count(),
+                    func.count().filter(ranked.c.rn == 1),
+                ).group_by(ranked.c.bucket_start, ranked.c.stage_label),
+            )
+        )
+    await _record_rebuild(db, "stage_counts")
+
+
+# ==================== BACKFILL ====================
+
+async def _record_rebuild(db: AsyncSession, rollup_name: str) -> None:
+    table = models.RollupRebuild.__table__
+    stmt = pg_insert(table).values(rollup_name=rollup_name, rebuilt_at=func.now())
+    await db.execute(stmt.on_conflict_do_update(index_elements=[table.c.rollup_name], set_={"rebuilt_at": func.now()}))
+
+
+async def _rebuilt(db: AsyncSession, rollup_name: str) -> bool:
+    return await db.get(models.RollupRebuild, rollup_name) is not None
+
+
+# Once true it stays true: a rollup is only ever replaced by another full rebuild
+_counts_backfilled = False
+
+
+async def stage_counts_backfilled(db: AsyncSession) -> bool:
+    """True once a full rebuild of the stage-count rollup has committed."""
+    global _counts_backfilled
+    if not _counts_backfilled:
+        _counts_backfilled = await _rebuilt(db, "stage_counts")
+    return _counts_backfilled
+
+
+async def backfill_rollups() -> None:
+    """Scheduler job (one worker): rebuild the rollups once, if no rebuild has committed yet."""
+    global _counts_backfilled
+    from .db import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        if await stage_counts_backfilled(db):
+            return
+        # A rebuild outlasting the job lock may still be running elsewhere: wait for it, then look again
+        await db.execute(text("LOCK TABLE rollup_rebuilds IN EXCLUSIVE MODE"))
+        if await _rebuilt(db, "stage_counts"):
+            await db.rollback()
+            return
+        logger.info("Stage rollups have never been rebuilt, rebuilding them from history")
+        await rebuild_stage_durations(db)
+        await rebuild_stage_counts(db)
+        await db.commit()
+    _counts_backfilled = True
+    logger.info("Stage rollups rebuilt")
+
+
+register_job("rollup_backfill", ROLLUP_BACKFILL_CHECK_SECONDS, backfill_rollups)
+
+
+# ==================== COMMAND LINE ====================
+
+async def rebuild_all() -> None:
+    from .db import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        await rebuild_stage_durations(db)
+        await rebuild_stage_counts(db)
+        await db.commit()
+    print("Rollups rebuilt: stage durations, stage counts")
+
+
+def main(argv: Sequence[str]) -> int:
+    if list(argv) != ["rebuild"]:
+        print("usage: python -m app.rollups rebuild")
+        return 2
+    asyncio.run(rebuild_all())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,14 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy import select, update
+from sqlalchemy import func, select, update
+import logging
 import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from .. import models, schemas, security
+from .. import models, schemas, security, sessions
 from ..db import get_db
 from ..limiter import limiter
-from ..cache import cache_delete
+from ..cache import cache_delete, cache_delete_many
+from ..deps import session_cache_key
 import hashlib
 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix='/auth', tags=['auth'])
 
 @router.post('/register', response_model=schemas.UserOut)
@@ -23,7 +30,7 @@ async def register(request: Request, user_in: schemas.UserCreate, db: AsyncSessi
     if q.scalars().first():
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_pw = security.get_password_hash(user_in.password)
+    hashed_pw = await security.get_password_hash_async(user_in.password)
     new_user = models.User(
         username=user_in.username,
         password_hash=hashed_pw,
@@ -39,32 +46,67 @@ async def register(request: Request, user_in: schemas.UserCreate, db: AsyncSessi
     await db.refresh(new_user)
     return new_user
 
+def _issue_session(db: AsyncSession, request: Request, user: models.User, family_id: Optional[uuid.UUID] = None) -> Tuple[str, str, str]:
+    """Mint an access/refresh token pair and stage their rows (the caller commits)"""
+    family_id = family_id or uuid.uuid4()
+    jti = uuid.uuid4()
+    access_token = security.create_access_token(str(user.id))
+    refresh_token = security.create_refresh_token(str(user.id), jti=str(jti), family_id=str(family_id))
+
+    # store hashed session token
+    token_hash = hashlib.sha256(access_token.encode()).hexdigest()
+    db.add(models.UserSession(user_id=user.id, session_token_hash=token_hash, is_active=True,
+    user_agent=request.headers.get('user-agent'), ip_address=request.client.host))
+    db.add(models.RefreshToken(jti=jti, family_id=family_id, user_id=user.id, session_token_hash=token_hash,
+    expires_at=datetime.now(timezone.utc) + timedelta(days=security.REFRESH_TOKEN_EXPIRE_DAYS)))
+    return access_token, refresh_token, token_hash
+
+
+async def _drop_sessions(token_hashes) -> None:
+    """
+    Drop exactly these (already deactivated) sessions from the registry and session cache,
+    and with it their verified tokens on every worker, instead of waiting for TTLs
+    """
+    if token_hashes:
+        await sessions.revoke_sessions(token_hashes)
+        await cache_delete_many([session_cache_key(h) for h in token_hashes])
+
+
 @router.post('/login', response_model=schemas.Token)
 @limiter.limit("100/minute") 
 async def login(request: Request, payload: schemas.LoginIn, db: AsyncSession = Depends(get_db)):
     q = await db.execute(select(models.User).where(models.User.username == payload.username))
     user = q.scalars().first()
-    if not user or not security.verify_password(payload.password, user.password_hash):
+    if not user or not await security.verify_password_async(payload.password, user.password_hash):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid credentials')
 
 
     # Session policy: allow multiple sessions if enabled via env var
     allow_multi = os.getenv("ALLOW_MULTI_SESSIONS", "false").lower() in ("1", "true", "yes")
+    revoked_hashes = []
     if not allow_multi:
-        # single session enforcement: deactivate other active sessions
-        await db.execute(update(models.UserSession).where(models.UserSession.user_id == user.id).values(is_active=False))
-        await db.commit()  # Commit the deactivation first
-
-    access_token = security.create_access_token(str(user.id))
-    refresh_token = security.create_refresh_token(str(user.id))
+        # single session enforcement: deactivate other active sessions (idx_user_sessions_user_active)
+        result = await db.execute(
+            update(models.UserSession)
+            .where(models.UserSession.user_id == user.id, models.UserSession.is_active == True)
+            .values(is_active=False)
+            .returning(models.UserSession.session_token_hash)
+        )
+        revoked_hashes = result.scalars().all()
+        # ... and their refresh tokens, or the old device could refresh its way back in
+        await db.execute(
+            update(models.RefreshToken)
+            .where(models.RefreshToken.user_id == user.id, models.RefreshToken.revoked_at.is_(None))
+            .values(revoked_at=func.now())
+        )
 
-    # store hashed session token
-    token_hash = hashlib.sha256(access_token.encode()).hexdigest()
-    session = models.UserSession(user_id=user.id, session_token_hash=token_hash, is_active=True,
-    user_agent=request.headers.get('user-agent'), ip_address=request.client.host)
-    db.add(session)
+    # deactivation and the new session commit together
+    access_token, refresh_token, token_hash = _issue_session(db, request, user)
     await db.commit()
 
+    await _drop_sessions(revoked_hashes)
+    await sessions.register_session(token_hash, user.id)
+
     # Return user data
     user_data = schemas.UserOut.model_validate(user)
 
@@ -72,6 +114,72 @@ async def login(request: Request, payload: schemas.LoginIn, db: AsyncSession = D
     return schemas.Token(access_token=access_token, refresh_token=refresh_token, user=user_data)
 
 
+async def _revoke_refresh_family(db: AsyncSession, family_id: uuid.UUID) -> None:
+    """Reuse of a spent refresh token: revoke every token and active session of its login"""
+    rt = models.RefreshToken
+    await db.execute(update(rt).where(rt.family_id == family_id, rt.revoked_at.is_(None)).values(revoked_at=func.now()))
+    result = await db.execute(
+        update(models.UserSession)
+        .where(
+            models.UserSession.session_token_hash.in_(select(rt.session_token_hash).where(rt.family_id == family_id)),
+            models.UserSession.is_active == True,
+        )
+        .values(is_active=False)
+        .returning(models.UserSession.session_token_hash)
+    )
+    revoked_hashes = result.scalars().all()
+    await db.commit()
+    await _drop_sessions(revoked_hashes)
+
+
+@router.post('/refresh', response_model=schemas.Token)
+@limiter.limit("100/minute")
+async def refresh(request: Request, payload: schemas.RefreshIn, db: AsyncSession = Depends(get_db)):
+    """
+    Exchange a refresh token for a new access/refresh pair without a password.
+    Each refresh token works once; presenting a spent one revokes the whole login.
+    """
+    claims = security.decode_token(payload.refresh_token)
+    try:
+        jti, family_id = uuid.UUID(claims['jti']), uuid.UUID(claims['fam'])
+    except (TypeError, KeyError, ValueError):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid refresh token')
+    if claims.get('type') != 'refresh':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid refresh token')
+
+    # Spend the token atomically: of two concurrent uses, only one gets the row back
+    rt = models.RefreshToken
+    spent = (await db.execute(
+        update(rt)
+        .where(rt.jti == jti, rt.used_at.is_(None), rt.revoked_at.is_(None), rt.expires_at > func.now())
+        .values(used_at=func.now())
+        .returning(rt.user_id, rt.session_token_hash)
+    )).first()
+    if spent is None or str(spent.user_id) != claims.get('sub'):
+        await db.rollback()
+        logger.warning(f"Refresh token reuse or revoked token for family {family_id}; revoking the family")
+        await _revoke_refresh_family(db, family_id)
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Refresh token is no longer valid')
+
+    user = await db.get(models.User, spent.user_id)
+    if not user or user.is_active is False:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid refresh token')
+
+    # The rotated session replaces the one issued with the spent token
+    await db.execute(
+        update(models.UserSession)
+        .where(models.UserSession.session_token_hash == spent.session_token_hash, models.UserSession.is_active == True)
+        .values(is_active=False)
+    )
+    access_token, refresh_token, token_hash = _issue_session(db, request, user, family_id)
+    await db.commit()
+
+    await _drop_sessions([spent.session_token_hash])
+    await sessions.register_session(token_hash, user.id)
+    return schemas.Token(access_token=access_token, refresh_token=refresh_token, user=schemas.UserOut.model_validate(user))
+
+
 @router.post('/logout')
 async def logout(request: Request, db: AsyncSession = Depends(get_db)):
     auth = request.headers.get('authorization')
@@ -82,15 +190,23 @@ async def logout(request: Request, db: AsyncSession = Depends(get_db)):
         token = auth.split(' ')[1]
         token_hash = hashlib.sha256(token.encode()).hexdigest()
         
-        # Invalidate cache
-        cache_key = f"user_session:{token_hash}"
-        await cache_delete(cache_key)
-        
         stmt = await db.execute(select(models.UserSession).where(models.UserSession.session_token_hash == token_hash, models.UserSession.is_active==True))
         ses = stmt.scalars().first()
         if ses:
             ses.is_active = False
+            # The login's refresh tokens die with it
+            rt = models.RefreshToken
+            await db.execute(
+                update(rt)
+                .where(rt.family_id.in_(select(rt.family_id).where(rt.session_token_hash == token_hash)), rt.revoked_at.is_(None))
+                .values(revoked_at=func.now())
+            )
             await db.commit()
+        # Revoke after the commit so a concurrent request cannot re-register the session
+        # from the DB; dropping the cache also drops the verified token on every worker
+        await sessions.revoke_sessions([token_hash])
+        await cache_delete(session_cache_key(token_hash))
+        if ses:
             return {"msg":"logged out"}
         else:
             # Session not found, but still return success (already logged out)
@@ -13,7 +13,9 @@ from sqlalchemy.orm import selectinload
 from .. import schemas, models
 from ..db import get_db
 from ..deps import get_current_user, get_current_user_hr, parse_new_candidate
-from ..cache import cache_get, cache_set, cache_delete_pattern
+from ..cache import cache_get, cache_set, cache_delete, cache_delete_many, cache_mark_stale
+from ..response_cache import invalidates_tags
+from ..stages import timeline_cache_key, transition_stages
 import os
 import aiofiles
 from ..utils import email_templates
@@ -225,6 +227,7 @@ async def download_candidate_template(current=Depends(get_current_user_hr)):
         403: {"description": "Forbidden (requires hr_admin)"},
     },
 )
+@invalidates_tags("candidate_stages")
 async def import_candidates_from_template(
     payload: List[Dict[str, Any]] = Body(..., description="Array of template objects"),
     db: AsyncSession = Depends(get_db),
@@ -264,8 +267,7 @@ async def import_candidates_from_template(
 
     # Invalidate related caches if any
     try:
-        await cache_delete_pattern("dashboard_stages:*")
-        await cache_delete_pattern("candidate_detail:*")
+        await cache_mark_stale("dashboard_stages")
     except Exception:
         pass
 
@@ -338,6 +340,7 @@ async def batch_upload_resumes(
     matched = 0
     unmatched = 0
     errors = []
+    updated_ids = []
 
     # Helper to normalize names for reliable matching
     def normalize_name(value: str) -> str:
@@ -428,6 +431,7 @@ async def batch_upload_resumes(
                 # Update candidate cv_file to the saved file path
                 candidate.cv_file = base_name  # Store just the filename, not full path
                 db.add(candidate)
+                updated_ids.append(candidate.uuid)
                 matched += 1
                 
             except Exception as e:
@@ -437,7 +441,7 @@ async def batch_upload_resumes(
     await db.commit()
     
     # Invalidate cache
-    await cache_delete_pattern("candidate_detail:*")
+    await cache_delete_many([timeline_cache_key(cid) for cid in updated_ids])
     
     return {
         "matched": matched,
@@ -464,6 +468,7 @@ async def batch_upload_resumes(
     },
     openapi_extra=CREATE_CANDIDATE_OPENAPI_REQUEST,
 )
+@invalidates_tags("candidate_stages")
 async def create_candidate(request: Request,payload: schemas.CandidatePayload = Depends(parse_new_candidate), db: AsyncSession = Depends(get_db), current=Depends(get_current_user_hr)):
     """
     Notes:
@@ -534,6 +539,7 @@ async def create_candidate(request: Request,payload: schemas.CandidatePayload =
         404: {"description": "Not found"},
     },
 )
+@invalidates_tags("candidate_stages")
 async def update_candidate(candidate_id:uuid.UUID,payload:schemas.CandidateUpdate,db:AsyncSession = Depends(get_db), current=Depends(get_current_user_hr)):
     """
     Partial update. Only provided fields are modified.
@@ -543,9 +549,8 @@ async def update_candidate(candidate_id:uuid.UUID,payload:schemas.CandidateUpdat
     await db.commit()
     
     # Invalidate cache
-    cache_key = f"candidate_detail:{candidate_id}"
-    await cache_delete_pattern(f"candidate_detail:{candidate_id}")
-    await cache_delete_pattern("dashboard_stages:*")  # Invalidate dashboard cache too
+    await cache_delete(timeline_cache_key(candidate_id))  # name, email and status are in the timeline
+    await cache_mark_stale("dashboard_stages")  # Dashboard serves stale until recomputed
     
     return # 200 No Content as documented
     
@@ -554,49 +559,22 @@ async def update_candidate(candidate_id:uuid.UUID,payload:schemas.CandidateUpdat
 
 @router.post(
     "/update-stages",
+    response_model=schemas.StageTransitionResponse,
     summary="Advance or change stages for multiple candidates",
     description=(
-        "Closes the latest stage for each candidate with duration and notes, updates `processed_status`, "
-        "then inserts a new stage row. Requires **hr_admin**."
+        "Closes the open stage for each candidate with duration and notes, "
+        "then inserts a new stage row. Validation, closing and inserting run as one CTE statement "
+        "(chunked for very large selections). Returns per-candidate outcomes and timing. Requires **hr_admin**."
     ),
     responses={
-        200: {"description": "Updated. Returns counts."},
+        200: {"description": "Updated. Returns counts, per-candidate outcomes and timing."},
         401: {"description": "Unauthorized"},
         403: {"description": "Forbidden (requires hr_admin)"},
     },
 )
-async def update_stages_candidate(payload:schemas.CandidateStageCreate,db:AsyncSession = Depends(get_db),current=Depends(get_current_user)):
-    
-    stmt = await db.execute(select(models.User).where(models.User.id == current.id, models.User.role.in_([models.UserRoleEnum.hr_admin])))
-    allowed = stmt.scalars().first()
-    if not allowed:
-        raise HTTPException(status_code=403, detail='Not allowed')
-
-    result = await db.execute(
-        select(models.Candidates.uuid).where(
-            models.Candidates.uuid.in_(payload.id)
-            # Removed processed_status check - field doesn't exist yet
-        )
-    )
-    valid_ids = [row[0] for row in result.fetchall()]
-
-    if not valid_ids:
-        return {"message": "No valid candidate IDs found. Nothing updated."}
+@invalidates_tags("candidate_stages")
+async def update_stages_candidate(payload:schemas.CandidateStageCreate,db:AsyncSession = Depends(get_db),current=Depends(get_current_user_hr)):
 
-    latest = select(
-        models.CandidateStages.candidate_id,
-        func.max(models.CandidateStages.entered_at).label("max_entered_at")
-            ).where(models.CandidateStages.candidate_id.in_(valid_ids)).group_by(models.CandidateStages.candidate_id).subquery()
-    
-    updated_stages_query = update(models.CandidateStages).where(
-        models.CandidateStages.candidate_id == latest.c.candidate_id,
-        models.CandidateStages.entered_at==latest.c.max_entered_at
-        ).values(
-            exited_at=func.now(),
-            duration_seconds=func.extract("epoch",func.now() - latest.c.max_entered_at),
-            hr_private_notes=payload.note
-        )
-    
     # Commented out - processed_status doesn't exist yet
     # update_candidates_process = update(
     #     models.Candidates
@@ -606,19 +584,22 @@ async def update_stages_candidate(payload:schemas.CandidateStageCreate,db:AsyncS
     #             processed_status=payload.candidate_status
     #         )
 
-    new_stages_dict = [{        
-        "candidate_id":c,
-        "stage_key":payload.candidate_status,
-        "created_by":current.id} for c in valid_ids]
-    
-    new_stages = insert(models.CandidateStages).values(new_stages_dict)
-
-    
-    await db.execute(updated_stages_query)
-    # await db.execute(update_candidates_process)  # Commented out - processed_status doesn't exist
-    await db.execute(new_stages)
+    summary = await transition_stages(
+        db,
+        payload.id,
+        stage_key=payload.candidate_status,
+        note=payload.note,
+        created_by=current.id,
+    )
     await db.commit()
-    return
+
+    # Invalidate timelines of candidates that got a new stage
+    await cache_delete_many([
+        timeline_cache_key(r["candidate_id"]) for r in summary["results"] if r["status"] == "moved"
+    ])
+    if summary["updated"]:
+        await cache_mark_stale("dashboard_stages")
+    return schemas.StageTransitionResponse(items=summary)
 
 
 # GET endpoints removed - they are in get_candidates.py:
@@ -1,12 +1,16 @@
-from datetime import datetime
-from typing import Dict, Optional
+import asyncio
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Literal, Optional, Tuple
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import String, cast, func, literal, select, literal_column, text, case, and_
+from sqlalchemy import Date, DateTime, String, cast, func, literal, select, literal_column, text, case, and_
 from .. import schemas, models
-from ..db import get_db
+from ..read_routing import get_read_db, read_session
 from ..deps import get_current_user
-from ..cache import cache_get, cache_set
+from ..cache import cache_get_or_compute
+from ..stages import open_stages_select
+from .. import rollups, dashboard_views
+from ..warmup import register_warmup
 
 router = APIRouter(prefix="/dashboard", tags=['reports'])
 
@@ -32,16 +36,269 @@ def _bucket_expr(period: schemas.PeriodEnum, tzname: str, dt_col):
         return None
     raise HTTPException(400, "invalid period")
 
-def _auto_bucket_for_custom(tzname: str, dt_col, start: datetime, end: datetime):
+def _custom_bucket_unit(start: datetime, end: datetime) -> str:
     span_days = max((end - start).days, 1)
-    ts = func.timezone(tzname, dt_col)
     if span_days <= 14:
-        return func.date_trunc("day", ts)
+        return "day"
     if span_days <= 120:
-        return func.date_trunc("week", ts)
+        return "week"
     if span_days <= 730:
+        return "month"
+    return "year"
+
+def _auto_bucket_for_custom(tzname: str, dt_col, start: datetime, end: datetime):
+    ts = func.timezone(tzname, dt_col)
+    return func.date_trunc(_custom_bucket_unit(start, end), ts)
+
+def _day_bucket_expr(period: schemas.PeriodEnum, day_col, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """Same buckets as _bucket_expr, for rollup columns that already hold a local date."""
+    ts = cast(day_col, DateTime)
+    if period == schemas.PeriodEnum.weekly:
+        return func.date_trunc("week", ts)
+    if period == schemas.PeriodEnum.monthly:
         return func.date_trunc("month", ts)
-    return func.date_trunc("year", ts)
+    if period == schemas.PeriodEnum.yearly:
+        return func.date_trunc("year", ts)
+    if period == schemas.PeriodEnum.all_time:
+        return literal_column("TIMESTAMP '1970-01-01'")
+    if period == schemas.PeriodEnum.custom:
+        return func.date_trunc(_custom_bucket_unit(start, end), ts)
+    raise HTTPException(400, "invalid period")
+
+def _day_window_filters(period: schemas.PeriodEnum, tzname: str, day_col, start: Optional[datetime], end: Optional[datetime]):
+    """Default windows of the stage dashboard, applied to a local-date column."""
+    if period == schemas.PeriodEnum.custom:
+        return [day_col >= start.date(), day_col <= end.date()]
+    today = cast(func.timezone(tzname, func.now()), Date)
+    if period in (schemas.PeriodEnum.weekly, schemas.PeriodEnum.monthly):
+        return [day_col >= today - text("interval '1 year'"), day_col <= today]
+    if period == schemas.PeriodEnum.yearly:
+        return [day_col >= today - text("interval '5 years'"), day_col <= today]
+    return []
+
+@router.get(
+    "/current-stages",
+    response_model=schemas.ResponseOut,
+    summary="Candidates per current stage",
+    description=(
+        "Counts candidates by their open stage (`exited_at IS NULL`). "
+        "Served from the open-stage partial index, so cost does not grow with stage history."
+    ),
+    responses={
+        401: {"description": "Unauthorized"},
+    },
+)
+async def get_current_stage_counts(
+    db: AsyncSession = Depends(get_read_db),
+    current=Depends(get_current_user),
+):
+    open_stages = open_stages_select().subquery("open_stages")
+    result = await db.execute(
+        select(open_stages.c.stage_key, func.count(literal(1)).label("cnt"))
+        .group_by(open_stages.c.stage_key)
+    )
+    counts = {s.value: 0 for s in models.CandidateStatusEnum}
+    for stage_key, cnt in result.all():
+        counts[stage_key.value] = cnt
+    return schemas.ResponseOut(items={"counts": counts, "total": sum(counts.values())})
+
+@router.get(
+    "/stage-durations",
+    response_model=schemas.StageDurationResponse,
+    summary="Time-in-stage percentiles over time",
+    description=(
+        "Returns p50/p90/p99 time spent in each stage (seconds), grouped by time bucket of the day the stage closed. "
+        "Read from the incrementally maintained duration sketch (`candidate_stage_duration_rollup`), "
+        "so percentiles carry a small bounded relative error (`relative_accuracy`). "
+        "Buckets and default windows follow `/dashboard/candidate-stages`."
+    ),
+    responses={
+        400: {"description": "Invalid input (custom range missing from/to, or to < from)"},
+        401: {"description": "Unauthorized"},
+    },
+)
+async def get_stage_durations(
+    period: schemas.PeriodEnum = Query(...),
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = Query(None),
+    db: AsyncSession = Depends(get_read_db),
+    current=Depends(get_current_user),
+):
+    if period == schemas.PeriodEnum.custom and (not from_ or not to):
+        raise HTTPException(400, "from and to are required for custom period")
+    if to and from_ and to < from_:
+        raise HTTPException(400, "to must be >= from")
+
+    r = models.StageDurationRollup
+    bucket = _day_bucket_expr(period, r.day, from_, to).label("bucket_start")
+    result = await db.execute(
+        select(bucket, r.stage_key, r.bucket, func.sum(r.count).label("cnt"))
+        .where(*_day_window_filters(period, TZ_NAME, r.day, from_, to))
+        .group_by(bucket, r.stage_key, r.bucket)
+    )
+
+    # {bucket_start: {stage: {sketch_bucket: count}}}
+    sketches: Dict[datetime, Dict[str, Dict[int, int]]] = {}
+    for b, stage_key, sketch_bucket, cnt in result.all():
+        sketches.setdefault(b, {}).setdefault(stage_key.value, {})[sketch_bucket] = int(cnt)
+
+    buckets = []
+    for b, stages in sorted(sketches.items(), key=lambda kv: kv[0]):
+        stats = {}
+        for stage, bins in sorted(stages.items()):
+            q = rollups.sketch_quantiles(bins, (0.5, 0.9, 0.99))
+            stats[stage] = schemas.StageDurationStats(
+                count=sum(bins.values()), p50_seconds=q[0.5], p90_seconds=q[0.9], p99_seconds=q[0.99],
+            )
+        buckets.append(schemas.StageDurationBucket(bucket_start=b, stages=stats))
+
+    return schemas.StageDurationResponse(items=schemas.StageDurationDashboard(
+        period=period, from_=from_, to=to,
+        relative_accuracy=rollups.SKETCH_RELATIVE_ACCURACY,
+        buckets=buckets,
+    ))
+
+async def _live_stage_rows(
+    db: AsyncSession,
+    period: schemas.PeriodEnum,
+    from_: Optional[datetime],
+    to: Optional[datetime],
+    latest_per_candidate_bucket: bool,
+):
+    """(bucket_start, stage_label, count) rows computed from the full stage history."""
+    tzname = await _validate_tzname(db, TZ_NAME)
+    dt_col = models.CandidateStages.entered_at
+
+    filters = []
+    # Bucketing + default windows
+    if period == schemas.PeriodEnum.custom:
+        filters += [dt_col >= from_, dt_col <= to]
+        bucket = _auto_bucket_for_custom(tzname, dt_col, from_, to)
+    else:
+        bucket = _bucket_expr(period, tzname, dt_col)
+        now = func.now()
+        if period in (schemas.PeriodEnum.weekly, schemas.PeriodEnum.monthly):
+            filters += [dt_col >= now - text("interval '1 year'"), dt_col <= now]
+        elif period == schemas.PeriodEnum.yearly:
+            filters += [dt_col >= now - text("interval '5 years'"), dt_col <= now]
+        # all-time: no date filter
+
+    bucket_lbl = "bucket_start"
+
+    # Previous stage over full candidate timeline (by entered_at ASC)
+    prev_stage = func.lag(models.CandidateStages.stage_key).over(
+        partition_by=models.CandidateStages.candidate_id,
+        order_by=models.CandidateStages.entered_at.asc(),
+    ).label("prev_stage")
+
+    # rejection reason mapping (shared with the rollup rebuild)
+    stage_label_expr = rollups.stage_label_expr(models.CandidateStages.stage_key, prev_stage).label("stage_label")
+
+    # Build the ranked subquery using REAL expressions for bucket + stage_label
+    bucket_expr = bucket.label(bucket_lbl)
+
+    ranked = (
+        select(
+            models.CandidateStages.candidate_id,
+            models.CandidateStages.stage_key,
+            prev_stage,
+            stage_label_expr,
+            models.CandidateStages.entered_at.label("entered_at"),
+            bucket_expr,
+            func.row_number().over(
+                partition_by=(models.CandidateStages.candidate_id, bucket_expr),
+                order_by=models.CandidateStages.entered_at.desc(),
+            ).label("rn"),
+        )
+        .where(*filters)
+        .subquery("ranked")
+    )
+    # Use the ranked.c columns directly in group_by/order_by. No string-y literals.
+    bucket_col = ranked.c[bucket_lbl]
+    label_col = ranked.c.stage_label
+
+    if latest_per_candidate_bucket:
+      stmt = (
+        select(bucket_col, label_col, func.count(literal(1)).label("cnt"))
+        .where(ranked.c.rn == 1)
+        .group_by(bucket_col, label_col)
+        .order_by(bucket_col.asc(), label_col.asc())
+      )
+    else:
+      stmt = (
+          select(bucket_col, label_col, func.count(literal(1)).label("cnt"))
+          .group_by(bucket_col, label_col)
+          .order_by(bucket_col.asc(), label_col.asc())
+      )
+    result = await db.execute(stmt)
+    return result.all()
+
+_ROLLUP_GRAINS = {
+    schemas.PeriodEnum.weekly: "week",
+    schemas.PeriodEnum.monthly: "month",
+    schemas.PeriodEnum.yearly: "year",
+    schemas.PeriodEnum.all_time: "all",
+}
+
+def _rollup_custom_window(grain: str, from_: datetime, to: datetime) -> Optional[Tuple[date, date]]:
+    """
+    First and last bucket_start covering exactly [from_, to], or None when the window
+    starts or ends inside a bucket (the rollup cannot clip it; the live query can).
+    `to` may stop at 23:59:59 of a bucket's last day, or lie in the future.
+    """
+    # asyncpg sends naive datetimes to timestamptz columns as UTC
+    start = (from_ if from_.tzinfo else from_.replace(tzinfo=timezone.utc)).astimezone(rollups.LOCAL_TZ)
+    end = (to if to.tzinfo else to.replace(tzinfo=timezone.utc)).astimezone(rollups.LOCAL_TZ)
+    if start.time() != time(0) or rollups.bucket_start(grain, start) != start.date():
+        return None
+    if end < datetime.now(timezone.utc):
+        next_day = end.date() + timedelta(days=1)
+        if end.time() < time(23, 59, 59) or rollups.bucket_start(grain, datetime.combine(next_day, time(0))) != next_day:
+            return None
+    return start.date(), end.date()
+
+async def _rollup_stage_rows(
+    db: AsyncSession,
+    period: schemas.PeriodEnum,
+    from_: Optional[datetime],
+    to: Optional[datetime],
+    latest_per_candidate_bucket: bool,
+):
+    """
+    (bucket_start, stage_label, count) rows summed from candidate_stage_count_rollup, or None
+    when the live query has to answer instead: the rollup has not been backfilled yet, or a
+    custom window does not line up with its buckets. Default windows cover whole buckets.
+    """
+    if not await rollups.stage_counts_backfilled(db):
+        return None
+    r = models.StageCountRollup
+    if period == schemas.PeriodEnum.custom:
+        grain = _custom_bucket_unit(from_, to)
+        window = _rollup_custom_window(grain, from_, to)
+        if window is None:
+            return None
+        filters = [r.bucket_start >= window[0], r.bucket_start <= window[1]]
+    else:
+        grain = _ROLLUP_GRAINS[period]
+        today = func.timezone(TZ_NAME, func.now())
+        filters = []
+        if period in (schemas.PeriodEnum.weekly, schemas.PeriodEnum.monthly):
+            filters = [r.bucket_start >= cast(func.date_trunc(grain, today - text("interval '1 year'")), Date)]
+        elif period == schemas.PeriodEnum.yearly:
+            filters = [r.bucket_start >= cast(func.date_trunc(grain, today - text("interval '5 years'")), Date)]
+
+    value = r.latest if latest_per_candidate_bucket else r.transitions
+    bucket_col = cast(r.bucket_start, DateTime).label("bucket_start")
+    cnt = func.sum(value)
+    stmt = (
+        select(bucket_col, r.stage_label, cnt.label("cnt"))
+        .where(r.grain == grain, *filters)
+        .group_by(r.bucket_start, r.stage_label)
+        .having(cnt > 0)
+        .order_by(r.bucket_start.asc(), r.stage_label.asc())
+    )
+    result = await db.execute(stmt)
+    return result.all()
 
 @router.get(
     "/candidate-stages",
@@ -54,7 +311,11 @@ def _auto_bucket_for_custom(tzname: str, dt_col, start: datetime, end: datetime)
         "- rejected after `interview_team_lead` → `fail_interview_lead`\n"
         "- otherwise → `unqualified`\n\n"
         "When `period=custom`, buckets auto-scale by the window size (day/week/month/year). "
-        "All timestamps are computed in the configured timezone."
+        "All timestamps are computed in the configured timezone.\n\n"
+        "By default counts come from the stage-count rollup maintained on every stage transition "
+        "(`source=rollup`), so cost does not grow with history; `source=live` recomputes from `candidate_stages`. "
+        "The rollup answers through the live query until it has been backfilled, and for custom windows "
+        "that start or end inside a bucket."
     ),
     responses={
         200: {
@@ -138,7 +399,20 @@ async def get_candidate_stages(
     from_: Optional[datetime] = Query(None, alias="from"),
     to: Optional[datetime] = Query(None),
     latest_per_candidate_bucket: bool = Query(True),
-    db: AsyncSession = Depends(get_db),
+    source: Literal["rollup", "live", "view"] = Query(
+        "rollup",
+        description=(
+            "`rollup` sums the incrementally maintained stage-count rollup; `live` recomputes from the full history; "
+            "`view` reads the period's materialized view (weekly/monthly/yearly) and falls back to `live` when it is "
+            "older than `max_staleness`."
+        ),
+    ),
+    max_staleness: Optional[int] = Query(
+        None,
+        ge=0,
+        description="Oldest acceptable materialized view, in seconds (source=view only).",
+    ),
+    db: AsyncSession = Depends(get_read_db),
     current=Depends(get_current_user),
 ):
     """
@@ -149,107 +423,75 @@ async def get_candidate_stages(
       - otherwise                    -> 'unqualified'
     TODO: 'fail_to_attend' hook is in place, wire it when your signal is ready.
     """
-    # Create cache key based on parameters
-    cache_key = f"dashboard_stages:{period.value}:{from_}:{to}:{latest_per_candidate_bucket}"
-    
-    # Check cache first
-    cached_result = await cache_get(cache_key)
-    if cached_result:
-        return schemas.DashboardResponse(items=cached_result)
-    
-    tzname = await _validate_tzname(db, TZ_NAME)
-    dt_col = models.CandidateStages.entered_at
-
     if period == schemas.PeriodEnum.custom and (not from_ or not to):
         raise HTTPException(400, "from and to are required for custom period")
     if to and from_ and to < from_:
         raise HTTPException(400, "to must be >= from")
 
-    filters = []
-    # Bucketing + default windows
-    if period == schemas.PeriodEnum.custom:
-        filters += [dt_col >= from_, dt_col <= to]
-        bucket = _auto_bucket_for_custom(tzname, dt_col, from_, to)
-    else:
-        bucket = _bucket_expr(period, tzname, dt_col)
-        now = func.now()
-        if period in (schemas.PeriodEnum.weekly, schemas.PeriodEnum.monthly):
-            filters += [dt_col >= now - text("interval '1 year'"), dt_col <= now]
-        elif period == schemas.PeriodEnum.yearly:
-            filters += [dt_col >= now - text("interval '5 years'"), dt_col <= now]
-        # all-time: no date filter
+    # The view path has its own staleness bound
+    if source == "view":
+        if max_staleness is None:
+            max_staleness = dashboard_views.DEFAULT_MAX_STALENESS
+        res = await _stage_dashboard(db, period, from_, to, latest_per_candidate_bucket, source, max_staleness)
+        return schemas.DashboardResponse(items=res)
 
-    bucket_lbl = "bucket_start"
+    res = await _cached_stage_dashboard(period, from_, to, latest_per_candidate_bucket, source)
+    return schemas.DashboardResponse(items=res)
 
-    # Previous stage over full candidate timeline (by entered_at ASC)
-    prev_stage = func.lag(models.CandidateStages.stage_key).over(
-        partition_by=models.CandidateStages.candidate_id,
-        order_by=models.CandidateStages.entered_at.asc(),
-    ).label("prev_stage")
 
-    # rejection reason mapping
-    rejection_reason = case(
-        (and_(
-            models.CandidateStages.stage_key == models.CandidateStatusEnum.rejected,
-            prev_stage == models.CandidateStatusEnum.coding_test,
-        ), literal("fail_coding_test")),
-        (and_(
-            models.CandidateStages.stage_key == models.CandidateStatusEnum.rejected,
-            prev_stage == models.CandidateStatusEnum.interview_team_lead,
-        ), literal("fail_interview_lead")),
-        # TODO: add fail_to_attend mapping when you have a signal
-        else_=literal("unqualified"),
-    )
-        
-    stage_label_expr = case(
-        (models.CandidateStages.stage_key == models.CandidateStatusEnum.rejected, rejection_reason),
-        else_=cast(models.CandidateStages.stage_key, String),
-    ).label("stage_label")
+async def _cached_stage_dashboard(
+    period: schemas.PeriodEnum,
+    from_: Optional[datetime],
+    to: Optional[datetime],
+    latest_per_candidate_bucket: bool,
+    source: str,
+) -> dict:
+    # Create cache key based on parameters
+    cache_key = f"dashboard_stages:{period.value}:{from_}:{to}:{latest_per_candidate_bucket}:{source}"
 
-    # Build the ranked subquery using REAL expressions for bucket + stage_label
-    bucket_expr = bucket.label(bucket_lbl)
+    # May run after the response is sent, so it opens its own (replica when usable) session
+    async def compute():
+        async with read_session() as session:
+            return await _stage_dashboard(session, period, from_, to, latest_per_candidate_bucket, source)
 
-    ranked = (
-        select(
-            models.CandidateStages.candidate_id,
-            models.CandidateStages.stage_key,
-            prev_stage,
-            stage_label_expr,
-            models.CandidateStages.entered_at.label("entered_at"),
-            bucket_expr,
-            func.row_number().over(
-                partition_by=(models.CandidateStages.candidate_id, bucket_expr),
-                order_by=models.CandidateStages.entered_at.desc(),
-            ).label("rn"),
-        )
-        .where(*filters)
-        .subquery("ranked")
-    )
-    # Use the ranked.c columns directly in group_by/order_by. No string-y literals.
-    bucket_col = ranked.c[bucket_lbl]
-    label_col = ranked.c.stage_label
+    # Fresh for 15 minutes, then served stale while one worker recomputes
+    return await cache_get_or_compute(cache_key, "dashboard_stages", compute, ttl=900)
 
-    if latest_per_candidate_bucket:
-      stmt = (
-        select(bucket_col, label_col, func.count(literal(1)).label("cnt"))
-        .where(ranked.c.rn == 1)
-        .group_by(bucket_col, label_col)
-        .order_by(bucket_col.asc(), label_col.asc())
-      )
-    else:
-      stmt = (
-          select(bucket_col, label_col, func.count(literal(1)).label("cnt"))
-          .group_by(bucket_col, label_col)
-          .order_by(bucket_col.asc(), label_col.asc())
-      )
-    result = await db.execute(stmt)
-    rows = result.all()
+
+async def warm_stage_dashboards() -> None:
+    """Default dashboard requests (every fixed period, both counting modes)."""
+    periods = (schemas.PeriodEnum.weekly, schemas.PeriodEnum.monthly, schemas.PeriodEnum.yearly, schemas.PeriodEnum.all_time)
+    await asyncio.gather(*(
+        _cached_stage_dashboard(period, None, None, latest, "rollup")
+        for period in periods
+        for latest in (True, False)
+    ))
+
+register_warmup("dashboard_stages", warm_stage_dashboards)
+
+
+async def _stage_dashboard(
+    db: AsyncSession,
+    period: schemas.PeriodEnum,
+    from_: Optional[datetime],
+    to: Optional[datetime],
+    latest_per_candidate_bucket: bool,
+    source: str,
+    max_staleness: Optional[int] = None,
+) -> dict:
+    rows = None
+    if source == "rollup":
+        rows = await _rollup_stage_rows(db, period, from_, to, latest_per_candidate_bucket)
+    elif source == "view":
+        rows = await dashboard_views.fetch_view_stage_rows(db, period, latest_per_candidate_bucket, max_staleness)
+    if rows is None:
+        rows = await _live_stage_rows(db, period, from_, to, latest_per_candidate_bucket)
 
     # Pivot to {bucket_start: {label: count}}
     buckets_map: Dict[datetime, Dict[str, int]] = {}
     for b, label, cnt in rows:
         # label comes out as str due to cast/literals above
-        buckets_map.setdefault(b, {})[str(label)] = cnt
+        buckets_map.setdefault(b, {})[str(label)] = int(cnt)
 
     # Zero-fill to keep series aligned
     all_labels = {k for d in buckets_map.values() for k in d}
@@ -261,9 +503,4 @@ async def get_candidate_stages(
         schemas.BucketItem(bucket_start=k, counts=v)
         for k, v in sorted(buckets_map.items(), key=lambda kv: kv[0])
     ]
-    res = schemas.Dashboard(period=period, from_=from_, to=to, buckets=buckets)
-    
-    # Cache result for 15 minutes
-    await cache_set(cache_key, res.model_dump(), ttl=900)
-    
-    return schemas.DashboardResponse(items=res)
+    return schemas.Dashboard(period=period, from_=from_, to=to, buckets=buckets).model_dump()
@@ -8,18 +8,20 @@ from typing import Optional
 from math import ceil
 
 from app import models, schemas
-from app.db import get_db
+from app.read_routing import get_read_db
 from app.deps import get_current_user_hr
+from app.cache import cache_result, READ_CACHE_TTL
 
 router = APIRouter(prefix='/employees', tags=['employees'])
 
 
 @router.get("", response_model=schemas.PaginatedOut)
+@cache_result(READ_CACHE_TTL, namespace="employees", exclude=("current",))
 async def get_employees(
     page: int = Query(1, ge=1),
     per_page: int = Query(10, ge=1, le=100),
     search: Optional[str] = Query(None),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current = Depends(get_current_user_hr)
 ):
     """Get all employees with pagination"""
@@ -67,9 +69,10 @@ async def get_employees(
 
 
 @router.get("/{uuid}")
+@cache_result(READ_CACHE_TTL, namespace="employees", exclude=("current",))
 async def get_employee(
     uuid: str,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current = Depends(get_current_user_hr)
 ):
     """Get single employee by UUID"""
@@ -86,9 +89,10 @@ async def get_employee(
 
 
 @router.get("/{uuid}/projects", response_model=schemas.EmployeeProjectDto)
+@cache_result(READ_CACHE_TTL, namespace="employees", exclude=("current",))
 async def get_employee_with_projects(
     uuid: str,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current = Depends(get_current_user_hr)
 ):
     """Get employee with all their active projects"""
@@ -139,9 +143,10 @@ async def get_employee_with_projects(
 
 
 @router.get("/teams/{team_name}/projects", response_model=schemas.TeamProjectsDto)
+@cache_result(READ_CACHE_TTL, namespace="employees", exclude=("current",))
 async def get_team_projects(
     team_name: str,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current = Depends(get_current_user_hr)
 ):
     """Get team with all members and all their projects (via employee_project_task + orbit_projects)"""
@@ -2,14 +2,19 @@
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import select, or_, func, asc, desc
+from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from typing import Optional
 from math import ceil
+import uuid
 
 from app import models, schemas
 from app.db import get_db
+from app.read_routing import get_read_db
 from app.deps import get_current_user_hr
+from app.cache import cache_get, cache_set, cache_get_many, cache_set_many
+from app.stages import TIMELINE_CACHE_TTL, timeline_cache_key
 
 
 router = APIRouter(prefix='/candidates', tags=['candidates']) 
@@ -42,7 +47,7 @@ async def get_candidates(
     sort_order: Optional[str] = Query("desc", description="Sort order: asc or desc"),
 
     # Dependencies
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current = Depends(get_current_user_hr)
 ):
 
@@ -126,7 +131,7 @@ async def get_candidates(
 )
 async def get_candidate_by_id(
     candidate_id: str,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current = Depends(get_current_user_hr)
 ):
     
@@ -147,6 +152,106 @@ async def get_candidate_by_id(
     return candidate
 
 
+# Candidate stage history (timeline)
+@router.get(
+    "/{candidate_id}/timeline",
+    response_model=schemas.CandidateTimelineResponse,
+    summary="Get candidate stage timeline",
+    description=(
+        "Returns every stage of the candidate (oldest first) with its creator and `duration_seconds`. "
+        "Loaded with `selectinload` in a fixed number of queries and cached per candidate; "
+        "the cache is dropped whenever the candidate's stages change."
+    ),
+    responses={
+        200: {"description": "Successfully retrieved timeline"},
+        404: {"description": "Candidate not found"},
+        401: {"description": "Unauthorized"},
+        403: {"description": "Forbidden - Requires HR admin role"},
+    }
+)
+async def get_candidate_timeline(
+    candidate_id: uuid.UUID,
+    db: AsyncSession = Depends(get_read_db),
+    current = Depends(get_current_user_hr)
+):
+    cache_key = timeline_cache_key(candidate_id)
+    cached = await cache_get(cache_key)
+    if cached:
+        return schemas.CandidateTimelineResponse(items=cached)
+
+    # 3 queries regardless of history length: candidate, stages, creators
+    candidates = await _load_timeline_candidates(db, [candidate_id])
+    if not candidates:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Candidate with ID {candidate_id} not found"
+        )
+
+    timeline = _build_timeline(candidates[0])
+    await cache_set(cache_key, timeline.model_dump(), ttl=TIMELINE_CACHE_TTL)
+    return schemas.CandidateTimelineResponse(items=timeline)
+
+
+@router.post(
+    "/timelines",
+    response_model=schemas.CandidateTimelineBatchResponse,
+    summary="Get stage timelines of many candidates",
+    description=(
+        "Batch form of `GET /candidates/{candidate_id}/timeline` (up to 200 ids). "
+        "Cached timelines are fetched in one round trip; the rest are loaded together "
+        "in a fixed number of queries and cached in one round trip."
+    ),
+    responses={
+        200: {"description": "Timelines of the candidates that exist, in request order"},
+        401: {"description": "Unauthorized"},
+        403: {"description": "Forbidden - Requires HR admin role"},
+    }
+)
+async def get_candidate_timelines(
+    payload: schemas.CandidateTimelineBatchRequest,
+    db: AsyncSession = Depends(get_db),
+    current = Depends(get_current_user_hr)
+):
+    candidate_ids = list(dict.fromkeys(payload.candidate_ids))
+    keys = {cid: timeline_cache_key(cid) for cid in candidate_ids}
+    cached = await cache_get_many(list(keys.values()))
+
+    timelines = {cid: cached[key] for cid, key in keys.items() if key in cached}
+    missing = [cid for cid in candidate_ids if cid not in timelines]
+    if missing:
+        loaded = {c.uuid: _build_timeline(c).model_dump() for c in await _load_timeline_candidates(db, missing)}
+        await cache_set_many({keys[cid]: t for cid, t in loaded.items()}, ttl=TIMELINE_CACHE_TTL)
+        timelines.update(loaded)
+
+    return schemas.CandidateTimelineBatchResponse(items=schemas.CandidateTimelineBatch(
+        timelines=[timelines[cid] for cid in candidate_ids if cid in timelines],
+        not_found=[cid for cid in candidate_ids if cid not in timelines],
+    ))
+
+
+async def _load_timeline_candidates(db: AsyncSession, candidate_ids: list):
+    result = await db.execute(
+        select(models.Candidates)
+        .options(
+            selectinload(models.Candidates.stages)
+            .selectinload(models.CandidateStages.creator)
+        )
+        .where(models.Candidates.uuid.in_(candidate_ids))
+    )
+    return result.scalars().all()
+
+
+def _build_timeline(candidate: models.Candidates) -> schemas.CandidateTimeline:
+    stages = sorted(candidate.stages, key=lambda s: (s.entered_at is None, s.entered_at))
+    return schemas.CandidateTimeline(
+        candidate_id=candidate.uuid,
+        name=candidate.name,
+        email=candidate.email,
+        candidate_status=candidate.candidate_status,
+        stages=[schemas.CandidateStageOut.model_validate(s) for s in stages],
+    )
+
+
 # 11. Check if the email existed in the database
 @router.get(
     "/email/{email}",
@@ -162,7 +267,7 @@ async def get_candidate_by_id(
 )
 async def get_candidate_by_email(
     email: str,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current = Depends(get_current_user_hr)
 ):
     """
@@ -202,7 +307,7 @@ async def get_candidate_by_email(
     }
 )
 async def count_candidates(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current = Depends(get_current_user_hr)
 ):
     
@@ -5,8 +5,12 @@ from typing import List, Dict, Any
 from uuid import UUID
 
 from app import models, schemas
-from app.db import get_db
+from app.db import get_db, AsyncSessionLocal
+from app.read_routing import get_read_db
 from app.deps import get_current_user_hr
+from app.cache import cache_result, READ_CACHE_TTL
+from app.response_cache import invalidates_tags
+from app.warmup import register_warmup
 
 router = APIRouter(prefix='/projects', tags=['projects'])
 
@@ -17,7 +21,7 @@ router = APIRouter(prefix='/projects', tags=['projects'])
 @router.get("/dashboard", response_model=Dict[str, Any])
 async def get_projects_dashboard(
     response: Response,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current = Depends(get_current_user_hr)
 ):
     # Force no caching - immediate fresh data
@@ -97,7 +101,7 @@ async def get_projects_dashboard(
 async def get_project_details(
     project_id: str,
     response: Response,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current = Depends(get_current_user_hr)
 ):
     # Force no caching - immediate fresh data
@@ -190,6 +194,7 @@ async def get_project_details(
 """ADD MEMBER to a project"""
 
 @router.post("/{project_id}/members")
+@invalidates_tags("employees", "projects")
 async def add_project_member(
     project_id: str,
     task_create: schemas.EmployeeProjectTaskCreate,
@@ -264,6 +269,7 @@ async def add_project_member(
 
 """Remove a member from a project"""
 @router.delete("/{project_id}/members/{task_id}")
+@invalidates_tags("employees", "projects")
 async def remove_project_member(
     project_id: str,
     task_id: UUID,
@@ -297,8 +303,9 @@ async def remove_project_member(
 
 
 @router.get("/available-employees/all", response_model=List[Dict[str, Any]])
+@cache_result(READ_CACHE_TTL, namespace="employees", exclude=("current",))
 async def get_available_employees(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current = Depends(get_current_user_hr)
 ):
     # Get all employees - deduplicate by UUID to ensure uniqueness
@@ -357,6 +364,7 @@ async def get_available_employees(
 
 """Update project details"""
 @router.put("/{project_id}", response_model=Dict[str, Any])
+@invalidates_tags("employees", "projects")
 async def update_project(
     project_id: str,
     project_update: schemas.ProjectUpdate,
@@ -419,6 +427,7 @@ async def update_project(
 
 """Alternative explicit Update endpoint (distinct path to avoid method conflicts)"""
 @router.put("/{project_id}/update", response_model=Dict[str, Any])
+@invalidates_tags("employees", "projects")
 async def update_project_explicit(
     project_id: str,
     project_update: schemas.ProjectUpdate,
@@ -473,4 +482,11 @@ async def update_project_explicit(
         },
         "team": None,
         "members": []
-    }
\ No newline at end of file
+    }
+
+
+async def warm_available_employees():
+    async with AsyncSessionLocal() as db:
+        await get_available_employees(db=db, current=None)
+
+register_warmup("available_employees", warm_available_employees)
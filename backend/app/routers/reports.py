@@ -4,7 +4,7 @@ from typing import Literal, Optional
 from fastapi import APIRouter, Depends,HTTPException, Query
 import pytz
 from .. import schemas, models
-from ..db import get_db
+from ..read_routing import get_read_db
 from ..deps import get_current_user, get_current_user_hr, parse_new_candidate
 from fastapi.responses import Response
 from reportlab.lib import colors
@@ -83,7 +83,7 @@ async def get_candidate_report(
         "excel",
         description="Output format. `excel` returns .xlsx, `pdf` returns a PDF.",
     ),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current=Depends(get_current_user_hr),
 ):
   # Only select fields that exist in your actual DB (Indonesian field names)
@@ -5,16 +5,20 @@ from typing import List, Dict, Any
 from uuid import UUID
 
 from app import models, schemas
-from app.db import get_db
+from app.db import AsyncSessionLocal
+from app.read_routing import get_read_db
 from app.deps import get_current_user_hr
+from app.cache import cache_result, READ_CACHE_TTL
+from app.warmup import register_warmup
 
 router = APIRouter(prefix='/teams', tags=['teams'])
 
 
 """Get all teams with their projects and members"""
 @router.get("/with-details", response_model=List[Dict[str, Any]])
+@cache_result(READ_CACHE_TTL, namespace="employees", exclude=("current",))
 async def get_teams_with_details(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current = Depends(get_current_user_hr)
 ):
     
@@ -78,9 +82,10 @@ async def get_teams_with_details(
 
 """Get project details with members assigned to it"""
 @router.get("/projects/{project_id}", response_model=Dict[str, Any])
+@cache_result(READ_CACHE_TTL, namespace="employees", exclude=("current",))
 async def get_project_details(
     project_id: UUID,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current = Depends(get_current_user_hr)
 ):
     # Get project
@@ -124,4 +129,11 @@ async def get_project_details(
         "project": schemas.Project.model_validate(project),
         "team": None,  # Projects are not tied to a single team
         "members": members
-    }
\ No newline at end of file
+    }
+
+
+async def warm_teams_with_details():
+    async with AsyncSessionLocal() as db:
+        await get_teams_with_details(db=db, current=None)
+
+register_warmup("teams_with_details", warm_teams_with_details)
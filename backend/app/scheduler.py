@@ -0,0 +1,116 @@
+"""
+Small in-process scheduler for periodic maintenance jobs.
+
+Jobs are registered at import/startup time and run as asyncio tasks started
+from the app lifespan. With several uvicorn workers every process runs the
+scheduler; `exclusive` jobs take a short Redis lock per tick so only one
+worker does the work (if Redis is unreachable the job runs locally anyway).
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Optional
+
+from .cache import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    def __init__(self, name: str, interval: float, func: Callable[[], Awaitable[None]], exclusive: bool = True, run_on_start: bool = True):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.exclusive = exclusive
+        self.run_on_start = run_on_start
+        self.task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.last_started: Optional[datetime] = None
+        self.last_duration_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def status(self) -> dict:
+        return {
+            "interval_seconds": self.interval,
+            "running": self.task is not None and not self.task.done(),
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "last_started": self.last_started.isoformat() if self.last_started else None,
+            "last_duration_ms": self.last_duration_ms,
+            "last_error": self.last_error,
+        }
+
+
+_jobs: Dict[str, Job] = {}
+
+
+def register_job(name: str, interval_seconds: float, func: Callable[[], Awaitable[None]], *, exclusive: bool = True, run_on_start: bool = True) -> Job:
+    """Register (or replace) a periodic job. Takes effect on the next start_scheduler()."""
+    job = Job(name, interval_seconds, func, exclusive=exclusive, run_on_start=run_on_start)
+    _jobs[name] = job
+    return job
+
+
+async def _acquire_tick(job: Job) -> bool:
+    if not job.exclusive:
+        return True
+    try:
+        redis_client = await get_redis()
+        # Lock lives slightly shorter than the interval so the next tick can take it
+        ttl = max(int(job.interval * 0.9), 1)
+        return bool(await redis_client.set(f"scheduler:lock:{job.name}", "1", nx=True, ex=ttl))
+    except Exception as e:
+        logger.warning(f"Scheduler lock for {job.name} unavailable, running locally: {e}")
+        return True
+
+
+async def run_job_once(job: Job) -> None:
+    if not await _acquire_tick(job):
+        job.skipped += 1
+        return
+    job.last_started = datetime.now(timezone.utc)
+    started = time.perf_counter()
+    try:
+        await job.func()
+        job.runs += 1
+        job.last_error = None
+    except Exception as e:
+        job.failures += 1
+        job.last_error = str(e)
+        logger.error(f"Scheduled job {job.name} failed: {e}")
+    finally:
+        job.last_duration_ms = round((time.perf_counter() - started) * 1000, 2)
+
+
+async def _loop(job: Job) -> None:
+    if not job.run_on_start:
+        await asyncio.sleep(job.interval)
+    while True:
+        await run_job_once(job)
+        await asyncio.sleep(job.interval)
+
+
+async def start_scheduler() -> None:
+    for job in _jobs.values():
+        if job.task is None or job.task.done():
+            job.task = asyncio.create_task(_loop(job), name=f"job:{job.name}")
+    if _jobs:
+        logger.info(f"Scheduler started: {', '.join(_jobs)}")
+
+
+async def stop_scheduler() -> None:
+    tasks = [job.task for job in _jobs.values() if job.task is not None]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for job in _jobs.values():
+        job.task = None
+
+
+def get_scheduler_status() -> dict:
+    return {name: job.status() for name, job in _jobs.items()}
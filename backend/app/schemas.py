@@ -18,6 +18,9 @@ class LoginIn(BaseModel):
     username: str
     password: str
 
+class RefreshIn(BaseModel):
+    refresh_token: str
+
 class Candidate(BaseModel):
     """Simplified Candidate schema matching actual DB fields"""
     model_config = ConfigDict(extra="ignore", from_attributes=True)
@@ -151,6 +154,66 @@ class CandidateStageCreate(BaseModel):
     note:str
     candidate_status:CandidateStatusEnum
 
+class StageTransitionOutcome(BaseModel):
+    candidate_id: uuid.UUID
+    status: Literal["moved", "not_found"]
+    previous_stage: Optional[CandidateStatusEnum] = None  # stage that was closed, if any
+    closed_duration_seconds: Optional[int] = None
+    stage_id: Optional[uuid.UUID] = None  # newly inserted stage row
+    entered_at: Optional[datetime] = None
+
+class StageTransitionSummary(BaseModel):
+    stage_key: CandidateStatusEnum
+    requested: int
+    updated: int
+    skipped: int
+    chunks: int
+    chunk_timings_ms: List[float]
+    elapsed_ms: float
+    results: List[StageTransitionOutcome]
+
+class StageTransitionResponse(BaseModel):
+    items: StageTransitionSummary
+
+class StageCreatorOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    id: uuid.UUID
+    username: str
+    fullname: str
+
+class CandidateStageOut(BaseModel):
+    model_config = ConfigDict(extra="ignore", from_attributes=True)
+    id: uuid.UUID
+    stage_key: CandidateStatusEnum
+    entered_at: Optional[datetime] = None
+    exited_at: Optional[datetime] = None
+    duration_seconds: Optional[int] = None  # filled when the stage closes
+    hr_private_notes: Optional[str] = None
+    send_email_on_reject: Optional[bool] = None
+    email_sent_at: Optional[datetime] = None
+    created_by: uuid.UUID
+    creator: Optional[StageCreatorOut] = None
+
+class CandidateTimeline(BaseModel):
+    candidate_id: uuid.UUID
+    name: Optional[str] = None
+    email: Optional[str] = None
+    candidate_status: Optional[CandidateStatusEnum] = None
+    stages: List[CandidateStageOut]  # oldest first
+
+class CandidateTimelineResponse(BaseModel):
+    items: CandidateTimeline
+
+class CandidateTimelineBatchRequest(BaseModel):
+    candidate_ids: List[uuid.UUID] = Field(..., min_length=1, max_length=200)
+
+class CandidateTimelineBatch(BaseModel):
+    timelines: List[CandidateTimeline]  # in request order
+    not_found: List[uuid.UUID]
+
+class CandidateTimelineBatchResponse(BaseModel):
+    items: CandidateTimelineBatch
+
 
 class EmailEnum(str,enum.Enum):
     rejection = "rejection"
@@ -186,6 +249,25 @@ class Dashboard(BaseModel):
 class DashboardResponse(BaseModel):
     items:Dashboard
 
+class StageDurationStats(BaseModel):
+    count: int  # closed stages in the bucket
+    p50_seconds: Optional[float] = None
+    p90_seconds: Optional[float] = None
+    p99_seconds: Optional[float] = None
+
+class StageDurationBucket(BaseModel):
+    bucket_start: datetime
+    stages: Dict[str, StageDurationStats]
+
+class StageDurationDashboard(BaseModel):
+    period: PeriodEnum
+    from_: Optional[datetime] = None
+    to: Optional[datetime] = None
+    relative_accuracy: float  # percentile values are within this relative error
+    buckets: List[StageDurationBucket]
+class StageDurationResponse(BaseModel):
+    items:StageDurationDashboard
+
 # Employee (matches actual database)
 class Employee(BaseModel):
     model_config = ConfigDict(from_attributes=True)
@@ -384,19 +466,6 @@ class ProjectMemberAttendanceResponse(BaseModel):
 #     uuid: uuid.UUID  # Changed from 'id' to match DB column
 #     model_config = ConfigDict(from_attributes=True)
 
-# class CandidateStageOut(BaseModel):
-#     model_config = ConfigDict(extra="ignore", from_attributes=True)
-#     id:uuid.UUID
-#     candidate_id:uuid.UUID 
-#     entered_at: datetime
-#     exited_at: Optional[datetime]
-#     duration_seconds:Optional[int]  
-#     hr_private_notes:Optional[str] 
-#     send_email_on_reject: bool 
-#     email_sent_at:Optional[datetime] 
-#     created_by:uuid.UUID 
-#     stage_key: CandidateStatusEnum
-
 # class CandidateCountOut(BaseModel):
 #     items: Dict[Union[CandidateStatusEnum, Literal["all"]],int]
 
@@ -1,6 +1,11 @@
+import asyncio
 import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import Optional
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from dotenv import load_dotenv
@@ -11,6 +16,9 @@ SECRET_KEY = os.getenv('SECRET_KEY')
 ALGORITHM = os.getenv('ALGORITHM', 'HS256')
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv('ACCESS_TOKEN_EXPIRE_MINUTES', '60'))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv('REFRESH_TOKEN_EXPIRE_DAYS', '7'))
+# bcrypt releases the GIL, so a small thread pool hashes in parallel without blocking the event loop
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv('PASSWORD_HASH_MAX_QUEUE', '32'))
 
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -24,6 +32,63 @@ def verify_password(plain: str, hashed: str) -> bool:
     return pwd_context.verify(plain, hashed)
 
 
+class PasswordHashingBusy(Exception):
+    """The hashing pool is saturated; the request should be retried later (503)"""
+
+
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_lock = threading.Lock()  # guards the counters updated from pool threads
+_hash_stats = {"pending": 0, "running": 0, "completed": 0, "rejected": 0, "peak_pending": 0, "wait_ms_total": 0.0}
+
+
+async def _run_hashing(func, *args):
+    """Run a bcrypt call on the hashing pool; fail fast instead of queueing past PASSWORD_HASH_MAX_QUEUE"""
+    if _hash_stats["pending"] >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_QUEUE:
+        _hash_stats["rejected"] += 1
+        raise PasswordHashingBusy()
+    _hash_stats["pending"] += 1
+    _hash_stats["peak_pending"] = max(_hash_stats["peak_pending"], _hash_stats["pending"])
+    submitted = time.perf_counter()
+
+    def job():
+        with _hash_lock:
+            _hash_stats["wait_ms_total"] += (time.perf_counter() - submitted) * 1000
+            _hash_stats["running"] += 1
+        try:
+            return func(*args)
+        finally:
+            with _hash_lock:
+                _hash_stats["running"] -= 1
+
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, job)
+    finally:
+        _hash_stats["pending"] -= 1
+        _hash_stats["completed"] += 1
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_hashing(get_password_hash, password)
+
+
+async def verify_password_async(plain: str, hashed: str) -> bool:
+    return await _run_hashing(verify_password, plain, hashed)
+
+
+def get_hashing_stats() -> dict:
+    completed = _hash_stats["completed"]
+    return {
+        "workers": PASSWORD_HASH_WORKERS,
+        "max_queue": PASSWORD_HASH_MAX_QUEUE,
+        "running": _hash_stats["running"],
+        "queued": max(_hash_stats["pending"] - _hash_stats["running"], 0),
+        "peak_pending": _hash_stats["peak_pending"],
+        "completed": completed,
+        "rejected": _hash_stats["rejected"],
+        "avg_wait_ms": round(_hash_stats["wait_ms_total"] / completed, 2) if completed else 0.0,
+    }
+
+
 def validate_password_strength(password: str) -> tuple[bool, str]:
     """
     Validate password strength based on requirements:
@@ -56,9 +121,14 @@ def create_access_token(subject: str) -> str:
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def create_refresh_token(subject: str) -> str:
+def create_refresh_token(subject: str, jti: Optional[str] = None, family_id: Optional[str] = None) -> str:
+    """Refresh token; jti identifies this token and fam the login it was rotated from (see /auth/refresh)"""
     expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode = {"sub": subject, "exp": expire}
+    to_encode = {"sub": subject, "exp": expire, "type": "refresh"}
+    if jti:
+        to_encode["jti"] = jti
+    if family_id:
+        to_encode["fam"] = family_id
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
@@ -0,0 +1,292 @@
+"""
+Active sessions in Redis and write-behind last_seen_at.
+
+Redis holds one key per active session (session:active:{token_hash} -> user id)
+that lives as long as the access token. Login adds the key and logout removes
+it. On startup the keys are rebuilt from user_sessions. get_current_user trusts
+a present key and only asks Postgres when it is missing. That happens after a
+Redis flush or with Redis unavailable, so sessions never depend on Redis alone.
+
+last_seen_at is buffered per worker and flushed in one batched UPDATE every
+SESSION_LAST_SEEN_FLUSH_SECONDS, so session tracking adds no per-request writes.
+
+Dead sessions (deactivated, or whose access token has expired) are deleted in
+batches once older than SESSION_RETENTION_DAYS, expired refresh tokens right away. With monthly partitioning
+(python -m app.sessions partition, then SESSION_PARTITIONING_ENABLED=true) the
+same job keeps future partitions created and drops whole expired ones.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import sys
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Sequence
+
+from sqlalchemy import DateTime, String, and_, column, delete, func, or_, select, text, update, values
+
+from . import models
+from .cache import _cache_error, get_redis
+from .db import AsyncSessionLocal, engine
+from .scheduler import register_job
+from .security import ACCESS_TOKEN_EXPIRE_MINUTES
+from .warmup import register_warmup
+
+logger = logging.getLogger(__name__)
+
+SESSION_TTL_SECONDS = ACCESS_TOKEN_EXPIRE_MINUTES * 60
+SESSION_LAST_SEEN_FLUSH_SECONDS = float(os.getenv('SESSION_LAST_SEEN_FLUSH_SECONDS', '60'))
+SESSION_FLUSH_CHUNK_SIZE = int(os.getenv('SESSION_FLUSH_CHUNK_SIZE', '1000'))
+SESSION_RETENTION_DAYS = int(os.getenv('SESSION_RETENTION_DAYS', '30'))
+SESSION_PRUNE_INTERVAL_SECONDS = float(os.getenv('SESSION_PRUNE_INTERVAL_SECONDS', '3600'))
+SESSION_PRUNE_BATCH_SIZE = int(os.getenv('SESSION_PRUNE_BATCH_SIZE', '5000'))
+SESSION_PARTITIONING_ENABLED = os.getenv('SESSION_PARTITIONING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+SESSION_PARTITIONS_AHEAD = int(os.getenv('SESSION_PARTITIONS_AHEAD', '2'))
+
+_last_seen: Dict[str, datetime] = {}
+_stats = {"registry_hits": 0, "registry_misses": 0, "registry_errors": 0, "rebuilt": 0, "flushed": 0, "pruned": 0, "refresh_tokens_pruned": 0, "partitions_dropped": 0}
+
+
+def session_registry_key(token_hash: str) -> str:
+    return f"session:active:{token_hash}"
+
+
+async def register_session(token_hash: str, user_id, ttl: int = SESSION_TTL_SECONDS) -> None:
+    try:
+        redis_client = await get_redis()
+        await redis_client.setex(session_registry_key(token_hash), ttl, str(user_id))
+    except Exception as e:
+        _cache_error("register session", e)
+
+
+async def revoke_sessions(token_hashes: Iterable[str]) -> None:
+    keys = [session_registry_key(h) for h in token_hashes]
+    if not keys:
+        return
+    try:
+        redis_client = await get_redis()
+        await redis_client.delete(*keys)
+    except Exception as e:
+        _cache_error("revoke sessions", e)
+
+
+async def is_session_active(token_hash: str, user_id) -> bool:
+    """True when Redis knows the session as active for this user; False means "ask the DB"."""
+    try:
+        redis_client = await get_redis()
+        owner = await redis_client.get(session_registry_key(token_hash))
+    except Exception as e:
+        _stats["registry_errors"] += 1
+        _cache_error("check session", e)
+        return False
+    if owner is not None and (owner.decode() if isinstance(owner, bytes) else owner) == str(user_id):
+        _stats["registry_hits"] += 1
+        return True
+    _stats["registry_misses"] += 1
+    return False
+
+
+async def rebuild_session_registry() -> None:
+    """Re-register every active session whose access token can still be valid."""
+    redis_client = await get_redis()
+    # One worker per deploy does the rebuild
+    if not await redis_client.set("session:registry:rebuild", "1", nx=True, ex=60):
+        return
+    now = datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(
+            select(models.UserSession.session_token_hash, models.UserSession.user_id, models.UserSession.created_at).where(
+                models.UserSession.is_active == True,
+                models.UserSession.created_at >= now - timedelta(seconds=SESSION_TTL_SECONDS),
+            )
+        )).all()
+    pipe = redis_client.pipeline(transaction=False)
+    for token_hash, user_id, created_at in rows:
+        ttl = int((created_at + timedelta(seconds=SESSION_TTL_SECONDS) - now).total_seconds())
+        if ttl > 0:
+            pipe.setex(session_registry_key(token_hash), ttl, str(user_id))
+    await pipe.execute()
+    _stats["rebuilt"] = len(rows)
+    logger.info(f"Session registry rebuilt with {len(rows)} active sessions")
+
+
+def touch_session(token_hash: str) -> None:
+    """Record activity in memory; flush_last_seen writes it out in batches."""
+    _last_seen[token_hash] = datetime.now(timezone.utc)
+
+
+async def flush_last_seen() -> None:
+    global _last_seen
+    if not _last_seen:
+        return
+    pending, _last_seen = _last_seen, {}
+    items = list(pending.items())
+    try:
+        async with AsyncSessionLocal() as db:
+            for start in range(0, len(items), SESSION_FLUSH_CHUNK_SIZE):
+                seen = values(
+                    column("token_hash", String), column("seen_at", DateTime(timezone=True)), name="seen"
+                ).data(items[start:start + SESSION_FLUSH_CHUNK_SIZE])
+                await db.execute(
+                    update(models.UserSession)
+                    .where(models.UserSession.session_token_hash == seen.c.token_hash, models.UserSession.is_active == True)
+                    .values(last_seen_at=seen.c.seen_at)
+                )
+            await db.commit()
+    except Exception:
+        # Keep what was not written (newer activity wins) for the next flush
+        for token_hash, seen_at in pending.items():
+            _last_seen.setdefault(token_hash, seen_at)
+        raise
+    _stats["flushed"] += len(items)
+
+
+# ==================== RETENTION ====================
+
+def _prunable(now: datetime):
+    """Dead sessions whose last activity is older than the retention window."""
+    us = models.UserSession
+    return (
+        or_(us.is_active.isnot(True), us.created_at < now - timedelta(seconds=SESSION_TTL_SECONDS)),
+        func.coalesce(us.last_seen_at, us.created_at) < now - timedelta(days=SESSION_RETENTION_DAYS),
+    )
+
+
+async def prune_sessions() -> None:
+    """Delete prunable sessions in batches of SESSION_PRUNE_BATCH_SIZE, one short transaction each."""
+    if SESSION_PARTITIONING_ENABLED:
+        await maintain_session_partitions()
+    now = datetime.now(timezone.utc)
+    total = await _delete_in_batches(models.UserSession.id, _prunable(now))
+    _stats["pruned"] += total
+    # Expired refresh tokens can no longer be presented, so reuse detection is done with them
+    refresh_total = await _delete_in_batches(models.RefreshToken.jti, (models.RefreshToken.expires_at < now,))
+    _stats["refresh_tokens_pruned"] += refresh_total
+    if total or refresh_total:
+        logger.info(f"Pruned {total} expired sessions and {refresh_total} expired refresh tokens")
+
+
+async def _delete_in_batches(pk, conditions) -> int:
+    total = 0
+    while True:
+        batch = select(pk).where(*conditions).limit(SESSION_PRUNE_BATCH_SIZE).scalar_subquery()
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(delete(pk.table).where(pk.in_(batch)))
+            await db.commit()
+        total += result.rowcount
+        if result.rowcount < SESSION_PRUNE_BATCH_SIZE:
+            return total
+        await asyncio.sleep(0.1)  # let logins in between batches
+
+
+# ==================== PARTITIONING ====================
+
+_PARTITION_NAME = re.compile(r"^user_sessions_p(\d{4})(\d{2})$")
+
+
+def _month_start(day: date, months: int = 0) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _partition_ddl(month: date) -> str:
+    upper = _month_start(month, 1)
+    return (
+        f"CREATE TABLE IF NOT EXISTS user_sessions_p{month:%Y%m} PARTITION OF user_sessions "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+    )
+
+
+async def _is_partitioned(conn) -> bool:
+    return bool((await conn.execute(text(
+        "select exists (select 1 from pg_partitioned_table where partrelid = 'user_sessions'::regclass)"
+    ))).scalar())
+
+
+async def _partitions(conn) -> List[str]:
+    rows = await conn.execute(text(
+        "select c.relname from pg_inherits i join pg_class c on c.oid = i.inhrelid "
+        "where i.inhparent = 'user_sessions'::regclass"
+    ))
+    return [name for (name,) in rows]
+
+
+async def maintain_session_partitions() -> None:
+    """Create the next SESSION_PARTITIONS_AHEAD months and drop months past retention."""
+    today = datetime.now(timezone.utc).date()
+    # A month can go once every session in it is dead and past retention
+    drop_before = _month_start(today - timedelta(days=SESSION_RETENTION_DAYS + 1))
+    async with engine.begin() as conn:
+        if not await _is_partitioned(conn):
+            logger.warning("SESSION_PARTITIONING_ENABLED but user_sessions is not partitioned; run python -m app.sessions partition")
+            return
+        for months in range(SESSION_PARTITIONS_AHEAD + 1):
+            await conn.execute(text(_partition_ddl(_month_start(today, months))))
+        for name in await _partitions(conn):
+            match = _PARTITION_NAME.match(name)
+            if match and _month_start(date(int(match[1]), int(match[2]), 1), 1) <= drop_before:
+                await conn.execute(text(f"DROP TABLE {name}"))
+                _stats["partitions_dropped"] += 1
+                logger.info(f"Dropped session partition {name}")
+
+
+async def partition_user_sessions() -> None:
+    """One-off: turn user_sessions into a table range-partitioned by month on created_at."""
+    now = datetime.now(timezone.utc)
+    async with engine.begin() as conn:
+        if await _is_partitioned(conn):
+            print("user_sessions is already partitioned")
+            return
+        await conn.execute(text("LOCK TABLE user_sessions IN ACCESS EXCLUSIVE MODE"))
+        oldest = (await conn.execute(select(func.min(models.UserSession.created_at)).where(~and_(*_prunable(now))))).scalar() or now
+        await conn.execute(text("ALTER TABLE user_sessions RENAME TO user_sessions_unpartitioned"))
+        await conn.execute(text("ALTER TABLE user_sessions_unpartitioned RENAME CONSTRAINT user_sessions_pkey TO user_sessions_unpartitioned_pkey"))
+        for index in models.UserSession.__table__.indexes:
+            await conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+        await conn.execute(text(
+            "CREATE TABLE user_sessions (LIKE user_sessions_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)"
+        ))
+        # The partition key has to be part of the primary key
+        await conn.execute(text("ALTER TABLE user_sessions ADD PRIMARY KEY (id, created_at)"))
+        await conn.execute(text("ALTER TABLE user_sessions ADD FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE"))
+        month = _month_start(oldest.date())
+        while month <= _month_start(now.date(), SESSION_PARTITIONS_AHEAD):
+            await conn.execute(text(_partition_ddl(month)))
+            month = _month_start(month, 1)
+        # Catches rows beyond the pre-created months if the scheduler ever stops
+        await conn.execute(text("CREATE TABLE user_sessions_default PARTITION OF user_sessions DEFAULT"))
+        await conn.run_sync(lambda sync_conn: [index.create(sync_conn) for index in models.UserSession.__table__.indexes])
+        # Same condition as _prunable(): only sessions the retention job would keep are copied
+        copied = await conn.execute(text(
+            "INSERT INTO user_sessions SELECT * FROM user_sessions_unpartitioned "
+            "WHERE NOT ((is_active IS NOT TRUE OR created_at < :expired_before) "
+            "AND coalesce(last_seen_at, created_at) < :cutoff)"
+        ), {"expired_before": now - timedelta(seconds=SESSION_TTL_SECONDS), "cutoff": now - timedelta(days=SESSION_RETENTION_DAYS)})
+        await conn.execute(text("DROP TABLE user_sessions_unpartitioned"))
+    print(f"user_sessions partitioned by month; kept {copied.rowcount} sessions")
+
+
+def get_session_stats() -> dict:
+    return {**_stats, "last_seen_pending": len(_last_seen)}
+
+
+# Every worker buffers its own activity, so every worker flushes (not exclusive)
+register_job("session_last_seen_flush", SESSION_LAST_SEEN_FLUSH_SECONDS, flush_last_seen, exclusive=False, run_on_start=False)
+register_job("session_prune", SESSION_PRUNE_INTERVAL_SECONDS, prune_sessions, run_on_start=False)
+register_warmup("session_registry", rebuild_session_registry)
+
+
+# ==================== COMMAND LINE ====================
+
+def main(argv: Sequence[str]) -> int:
+    commands = {"partition": partition_user_sessions, "prune": prune_sessions}
+    if len(argv) != 1 or argv[0] not in commands:
+        print("usage: python -m app.sessions partition|prune")
+        return 2
+    asyncio.run(commands[argv[0]]())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,233 @@
+"""
+Candidate stage queries and transitions.
+
+Bulk stage changes run as a single data-modifying CTE per chunk: the requested
+ids are unnested from array parameters, validated against `candidates`, the
+open stage of every valid candidate is closed and the new stage rows are
+inserted, all in one round trip.
+
+Open-stage lookups (`exited_at IS NULL`) are served by the partial index
+`idx_candidate_stages_open`, which covers every selected column.
+"""
+
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from sqlalchemy import BigInteger, Select, any_, bindparam, cast, func, insert, literal, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, rollups
+
+# Above this many candidates the transition is split into several statements
+# (same transaction) so a single statement never carries huge arrays.
+STAGE_TRANSITION_CHUNK_SIZE = int(os.getenv("STAGE_TRANSITION_CHUNK_SIZE", "1000"))
+
+_UUID_ARRAY = ARRAY(UUID(as_uuid=True))
+
+# Per-candidate timeline cache (GET /candidates/{id}/timeline); drop on every write to the candidate or its stages
+TIMELINE_CACHE_TTL = int(os.getenv("TIMELINE_CACHE_TTL", "3600"))
+
+
+def timeline_cache_key(candidate_id) -> str:
+    return f"candidate_timeline:{candidate_id}"
+
+
+def open_stages_select(candidate_ids: Union[Sequence[uuid.UUID], Select, None] = None) -> Select:
+    """
+    Open stage (candidate_id, id, stage_key, entered_at) per candidate.
+
+    `candidate_ids` may be a list of ids (bound as one array, `= ANY(...)`),
+    a select returning ids, or None for every candidate with an open stage.
+    DISTINCT ON keeps one row per candidate if legacy data has several open stages.
+    """
+    cs = models.CandidateStages
+    stmt = (
+        select(cs.candidate_id, cs.id, cs.stage_key, cs.entered_at)
+        .where(cs.exited_at.is_(None))
+        .distinct(cs.candidate_id)
+        .order_by(cs.candidate_id, cs.entered_at.desc())
+    )
+    if isinstance(candidate_ids, Select):
+        stmt = stmt.where(cs.candidate_id.in_(candidate_ids))
+    elif candidate_ids is not None:
+        stmt = stmt.where(cs.candidate_id == any_(cast(literal(list(candidate_ids), _UUID_ARRAY), _UUID_ARRAY)))
+    return stmt
+
+
+def _transition_statement():
+    """
+    Build the transition statement. Bind params: candidate_ids, stage_ids,
+    stage_key, note, created_by.
+    """
+    cs = models.CandidateStages.__table__
+    candidates = models.Candidates.__table__
+
+    requested = (
+        select(
+            func.unnest(
+                cast(bindparam("candidate_ids", type_=_UUID_ARRAY), _UUID_ARRAY),
+                cast(bindparam("stage_ids", type_=_UUID_ARRAY), _UUID_ARRAY),
+            )
+            .table_valued("candidate_id", "stage_id", with_ordinality="ord")
+            .render_derived(name="req")
+        )
+        .cte("requested")
+    )
+
+    valid = (
+        select(requested.c.candidate_id, requested.c.stage_id)
+        .join(candidates, candidates.c.uuid == requested.c.candidate_id)
+        .cte("valid")
+    )
+
+    # Latest stage before this transition (and the one before it, for its dashboard label)
+    history = (
+        select(
+            cs.c.candidate_id,
+            cs.c.stage_key,
+            cs.c.entered_at,
+            func.lead(cs.c.stage_key).over(
+                partition_by=cs.c.candidate_id, order_by=cs.c.entered_at.desc()
+            ).label("prev_key"),
+            func.row_number().over(
+                partition_by=cs.c.candidate_id, order_by=cs.c.entered_at.desc()
+            ).label("rn"),
+        )
+        .where(cs.c.candidate_id.in_(select(valid.c.candidate_id)))
+        .subquery("history")
+    )
+    latest = (
+        select(
+            history.c.candidate_id,
+            history.c.stage_key.label("latest_stage"),
+            history.c.entered_at.label("latest_entered_at"),
+            history.c.prev_key.label("latest_prev"),
+        )
+        .where(history.c.rn == 1)
+        .cte("latest")
+    )
+
+    open_stage = open_stages_select(select(valid.c.candidate_id)).subquery("open_stage")
+
+    closed = (
+        update(cs)
+        .where(cs.c.id == open_stage.c.id)
+        .values(
+            exited_at=func.now(),
+            duration_seconds=cast(func.extract("epoch", func.now() - cs.c.entered_at), BigInteger),
+            hr_private_notes=bindparam("note"),
+        )
+        .returning(
+            cs.c.candidate_id,
+            cs.c.stage_key.label("previous_stage"),
+            cs.c.duration_seconds,
+        )
+        .cte("closed")
+    )
+
+    inserted = (
+        insert(cs)
+        .from_select(
+            ["id", "candidate_id", "stage_key", "created_by"],
+            select(
+                valid.c.stage_id,
+                valid.c.candidate_id,
+                cast(bindparam("stage_key", type_=cs.c.stage_key.type), cs.c.stage_key.type),
+                cast(bindparam("created_by", type_=UUID(as_uuid=True)), UUID(as_uuid=True)),
+            ),
+        )
+        .returning(cs.c.candidate_id, cs.c.id, cs.c.entered_at)
+        .cte("inserted")
+    )
+
+    return (
+        select(
+            requested.c.candidate_id,
+            valid.c.candidate_id.isnot(None).label("found"),
+            closed.c.previous_stage,
+            closed.c.duration_seconds,
+            inserted.c.id.label("stage_id"),
+            inserted.c.entered_at,
+            latest.c.latest_stage,
+            latest.c.latest_entered_at,
+            latest.c.latest_prev,
+        )
+        .select_from(
+            requested
+            .outerjoin(valid, valid.c.candidate_id == requested.c.candidate_id)
+            .outerjoin(latest, latest.c.candidate_id == requested.c.candidate_id)
+            .outerjoin(closed, closed.c.candidate_id == requested.c.candidate_id)
+            .outerjoin(inserted, inserted.c.candidate_id == requested.c.candidate_id)
+        )
+        .order_by(requested.c.ord)  # rows come back in request order
+    )
+
+
+async def transition_stages(
+    db: AsyncSession,
+    candidate_ids: Sequence[uuid.UUID],
+    stage_key: models.CandidateStatusEnum,
+    note: Optional[str],
+    created_by: uuid.UUID,
+    chunk_size: int = STAGE_TRANSITION_CHUNK_SIZE,
+) -> Dict[str, Any]:
+    """
+    Move every candidate in `candidate_ids` to `stage_key` and fold the closed
+    stages into the rollups. The caller owns the transaction (commit after this returns).
+
+    Returns a summary with per-candidate outcomes and timing.
+    """
+    started = time.perf_counter()
+    ids = list(dict.fromkeys(candidate_ids))  # dedupe, keep request order
+    chunk_size = max(chunk_size, 1)
+    stmt = _transition_statement()
+
+    results: List[Dict[str, Any]] = []
+    chunk_timings: List[float] = []
+    for offset in range(0, len(ids), chunk_size):
+        chunk = ids[offset:offset + chunk_size]
+        chunk_started = time.perf_counter()
+        rows = (await db.execute(stmt, {
+            "candidate_ids": chunk,
+            "stage_ids": [uuid.uuid4() for _ in chunk],
+            "stage_key": stage_key,
+            "note": note,
+            "created_by": created_by,
+        })).all()
+        await rollups.record_closed_stages(db, ((row.previous_stage, row.duration_seconds) for row in rows))
+        await rollups.record_stage_transitions(db, (
+            {
+                "stage_key": stage_key,
+                "entered_at": row.entered_at,
+                "latest_stage": row.latest_stage,
+                "latest_entered_at": row.latest_entered_at,
+                "latest_prev": row.latest_prev,
+            }
+            for row in rows if row.found
+        ))
+        chunk_timings.append(round((time.perf_counter() - chunk_started) * 1000, 2))
+
+        for row in rows:
+            results.append({
+                "candidate_id": row.candidate_id,
+                "status": "moved" if row.found else "not_found",
+                "previous_stage": row.previous_stage,
+                "closed_duration_seconds": row.duration_seconds,
+                "stage_id": row.stage_id,
+                "entered_at": row.entered_at,
+            })
+
+    updated = sum(1 for r in results if r["status"] == "moved")
+    return {
+        "stage_key": stage_key,
+        "requested": len(ids),
+        "updated": updated,
+        "skipped": len(results) - updated,
+        "chunks": len(chunk_timings),
+        "chunk_timings_ms": chunk_timings,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        "results": results,
+    }
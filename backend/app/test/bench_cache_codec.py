@@ -0,0 +1,105 @@
+"""
+Benchmark cache codecs on the payload shapes we actually cache.
+
+    python -m app.test.bench_cache_codec [iterations]
+
+For each payload: encoded size and mean encode/decode time per codec.
+"""
+
+import json
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app import cache_codec, schemas
+
+LABELS = [
+    "applied", "resume_scraped", "screened", "survey", "coding_test", "interview_team_lead",
+    "interview_general_manager", "offer", "hired", "fail_coding_test", "fail_interview_lead", "unqualified",
+]
+
+
+def dashboard_payload(weeks: int = 52) -> dict:
+    start = datetime(2025, 1, 6)
+    buckets = [
+        schemas.BucketItem(bucket_start=start + timedelta(weeks=i), counts={label: (i * 7 + j) % 40 for j, label in enumerate(LABELS)})
+        for i in range(weeks)
+    ]
+    return {"v": schemas.Dashboard(period=schemas.PeriodEnum.weekly, buckets=buckets).model_dump(), "t": time.time()}
+
+
+def user_session_payload() -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "username": "john",
+        "fullname": "John Doe",
+        "email": "john@example.com",
+        "role": "hr_admin",
+        "is_active": True,
+    }
+
+
+def team_payload(members: int = 40, projects: int = 3) -> dict:
+    team = schemas.TeamProjectsDto(
+        team_name="Platform",
+        members=[
+            schemas.TeamMemberWithProjects(
+                uuid=str(uuid.uuid4()),
+                name=f"Employee {m}",
+                employee_id=f"E{m:05d}",
+                email=f"employee{m}@example.com",
+                role="Backend Engineer",
+                team="Platform",
+                projects=[
+                    schemas.EmployeeProjectItem(
+                        task_id=f"T{m}-{p}",
+                        project_id=f"ORBIT{p:06d}",
+                        project_name=f"Project {p}",
+                        project_description="Internal tooling and services for the hiring pipeline.",
+                        contribution="API development, code review and on-call",
+                        status="active",
+                        start_date="2025-01-01",
+                    )
+                    for p in range(projects)
+                ],
+            )
+            for m in range(members)
+        ],
+    )
+    return team.model_dump()
+
+
+def _mean_us(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def run(iterations: int = 2000) -> None:
+    payloads = {
+        "user_session": user_session_payload(),
+        "dashboard_weekly": dashboard_payload(),
+        "team_projects": team_payload(),
+    }
+    variants = [
+        ("json (legacy)", lambda v: json.dumps(v, default=str).encode(), json.loads),
+        ("json", lambda v: cache_codec.encode(v, codec="json", compress_min_bytes=0), cache_codec.decode),
+        ("orjson", lambda v: cache_codec.encode(v, codec="orjson", compress_min_bytes=0), cache_codec.decode),
+        ("orjson+zlib", lambda v: cache_codec.encode(v, codec="orjson", compress_min_bytes=1), cache_codec.decode),
+    ]
+    if cache_codec.orjson is None:
+        print("orjson not installed: orjson rows fall back to json")
+
+    print(f"{'payload':<18} {'codec':<14} {'bytes':>8} {'encode us':>10} {'decode us':>10}")
+    for name, value in payloads.items():
+        for label, dumps, loads in variants:
+            raw = dumps(value)
+            enc = _mean_us(lambda: dumps(value), iterations)
+            dec = _mean_us(lambda: loads(raw), iterations)
+            print(f"{name:<18} {label:<14} {len(raw):>8} {enc:>10.1f} {dec:>10.1f}")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
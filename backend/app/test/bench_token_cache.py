@@ -0,0 +1,45 @@
+"""
+Benchmark per-request token verification with and without the verified-token LRU.
+
+    python -m app.test.bench_token_cache [iterations]
+
+"uncached" is what every authenticated request used to pay (JWT decode with
+signature check plus SHA-256 of the token); "cached" is an LRU hit in deps.verify_token.
+"""
+
+import hashlib
+import os
+import sys
+import time
+
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+from app import deps, security  # noqa: E402
+
+
+def _mean_us(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def _uncached(token: str):
+    payload = security.decode_token(token)
+    return payload, hashlib.sha256(token.encode()).hexdigest()
+
+
+def run(iterations: int = 20000) -> None:
+    token = security.create_access_token("6f1c2b7e-3f1a-4c55-9a57-2d3c9c1e0b42")
+    deps.verify_token(token)  # populate the LRU
+
+    uncached = _mean_us(lambda: _uncached(token), iterations)
+    cached = _mean_us(lambda: deps.verify_token(token), iterations)
+    print(f"{'variant':<10} {'us/request':>11}")
+    print(f"{'uncached':<10} {uncached:>11.2f}")
+    print(f"{'cached':<10} {cached:>11.2f}")
+    print(f"saved {uncached - cached:.2f} us of CPU per authenticated request ({uncached / cached:.0f}x)")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
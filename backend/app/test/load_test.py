@@ -44,6 +44,7 @@ class CandidatesUser(HttpUser):
             if response.status_code == 200:
                 data = response.json()
                 self.access_token = data.get("access_token")
+                self.refresh_token = data.get("refresh_token")
                 self.user_id = data.get("user", {}).get("id")
                 self.headers = {"Authorization": f"Bearer {self.access_token}"}
                 
@@ -56,10 +57,29 @@ class CandidatesUser(HttpUser):
                 response.failure(f"Authentication failed: {response.status_code}")
                 raise Exception("Authentication failed")
     
+    def refresh(self) -> bool:
+        """Rotate the refresh token instead of logging in again (no password hashing)"""
+        if not getattr(self, 'refresh_token', None):
+            return False
+        with self.client.post("/auth/refresh", json={"refresh_token": self.refresh_token}, catch_response=True) as response:
+            if response.status_code != 200:
+                response.success()  # expected when the login was replaced; fall back to login
+                self.refresh_token = None
+                return False
+            data = response.json()
+            self.access_token = data.get("access_token")
+            self.refresh_token = data.get("refresh_token")
+            self.headers = {"Authorization": f"Bearer {self.access_token}"}
+            if self.user_id and self.access_token:
+                token_manager.add_token(self.user_id, self.access_token)
+            response.success()
+            return True
+    
     def handle_auth_error(self, response):
-        """Handle authentication errors by re-authenticating"""
+        """Handle authentication errors by refreshing, or re-authenticating when that fails"""
         if response.status_code == 401:
-            self.authenticate()
+            if not self.refresh():
+                self.authenticate()
             return True
         return False
     
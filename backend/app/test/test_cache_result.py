@@ -0,0 +1,28 @@
+import asyncio
+import uuid
+from datetime import date
+
+from fastapi.encoders import jsonable_encoder
+
+from app import schemas
+from app.cache import cache_result
+
+
+def test_hit_returns_the_data_of_the_miss():
+    calls = []
+
+    @cache_result(60, namespace="test_cache_result")
+    async def team_details(team_id: str):
+        calls.append(team_id)
+        return [{
+            "team": schemas.Team(team_id=team_id, team_name="Platform"),
+            "projects": [{"id": uuid.UUID(int=1), "start_date": date(2024, 1, 1)}],
+        }]
+
+    async def run():
+        return await team_details("team_1"), await team_details("team_1")
+
+    miss, hit = asyncio.run(run())
+    assert calls == ["team_1"]
+    assert hit == jsonable_encoder(miss)
+    assert hit[0]["team"] == {"team_id": "team_1", "team_name": "Platform", "team_description": None}
@@ -0,0 +1,23 @@
+import asyncio
+
+from app import cache
+
+
+def test_cold_miss_returns_value_when_cache_write_fails(monkeypatch):
+    async def run():
+        redis_client = await cache.get_redis()
+
+        async def failing_setex(*args, **kwargs):
+            raise ConnectionError("write failed")
+
+        monkeypatch.setattr(redis_client, "setex", failing_setex)
+
+        async def compute():
+            return {"total": 3}
+
+        value = await cache.cache_get_or_compute("test_swr:cold", "test_swr", compute, ttl=60)
+        # The lock was released, so the next miss can compute again
+        assert await redis_client.get("swr:lock:test_swr:cold") is None
+        return value
+
+    assert asyncio.run(run()) == {"total": 3}
@@ -0,0 +1,29 @@
+from fastapi import Request
+
+from app import limiter
+
+
+def _request(peer: str, forwarded_for: str = "") -> Request:
+    headers = [(b"x-forwarded-for", forwarded_for.encode())] if forwarded_for else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers, "client": (peer, 50000)})
+
+
+def test_client_behind_gcp_load_balancer_and_nginx(monkeypatch):
+    monkeypatch.setattr(limiter, "TRUSTED_PROXY_HOPS", 2)
+    # <client>, <lb frontend ip>, <gfe ip appended by nginx>
+    assert limiter.client_ip(_request("127.0.0.1", "203.0.113.7, 34.80.84.47, 35.191.10.1")) == "203.0.113.7"
+    # Whatever the client puts in front of its own entry is ignored
+    assert limiter.client_ip(_request("127.0.0.1", "10.9.9.9, 203.0.113.7, 34.80.84.47, 35.191.10.1")) == "203.0.113.7"
+    # Straight to nginx: nginx's entry is the client
+    assert limiter.client_ip(_request("127.0.0.1", "198.51.100.4")) == "198.51.100.4"
+
+
+def test_untrusted_peer_is_the_client(monkeypatch):
+    monkeypatch.setattr(limiter, "TRUSTED_PROXY_HOPS", 2)
+    assert limiter.client_ip(_request("198.51.100.4", "203.0.113.7, 34.80.84.47, 35.191.10.1")) == "198.51.100.4"
+    assert limiter.client_ip(_request("127.0.0.1")) == "127.0.0.1"
+
+
+def test_zero_hops_skips_trusted_proxies_from_the_right(monkeypatch):
+    monkeypatch.setattr(limiter, "TRUSTED_PROXY_HOPS", 0)
+    assert limiter.client_ip(_request("127.0.0.1", "10.9.9.9, 203.0.113.7, 127.0.0.1")) == "203.0.113.7"
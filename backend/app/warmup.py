@@ -0,0 +1,93 @@
+"""
+Cache warm-up on startup.
+
+Modules register warmers (async callables) at import time; the app lifespan
+runs them all concurrently in the background within CACHE_WARMUP_BUDGET_SECONDS,
+so the first users after a deploy hit warm caches. Progress is exposed as
+readiness (/health/ready), separate from liveness (/health/live): a worker that
+is still warming is alive and serving, just not warm yet.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CACHE_WARMUP_ENABLED = os.getenv("CACHE_WARMUP_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_WARMUP_BUDGET_SECONDS = float(os.getenv("CACHE_WARMUP_BUDGET_SECONDS", "20"))
+
+_warmers: Dict[str, Callable[[], Awaitable[None]]] = {}
+_results: Dict[str, dict] = {}
+_state = {"status": "pending", "started_at": None, "finished_at": None, "elapsed_ms": None}
+_task: Optional[asyncio.Task] = None
+
+
+def register_warmup(name: str, func: Callable[[], Awaitable[None]]) -> None:
+    """Register (or replace) a warmer; it must open its own DB session if it needs one."""
+    _warmers[name] = func
+
+
+async def _run_one(name: str, func: Callable[[], Awaitable[None]]) -> None:
+    started = time.perf_counter()
+    try:
+        await func()
+        _results[name] = {"status": "ok"}
+    except asyncio.CancelledError:
+        _results[name] = {"status": "timed_out"}
+        raise
+    except Exception as e:
+        logger.error(f"Cache warm-up {name} failed: {e}")
+        _results[name] = {"status": "failed", "error": str(e)}
+    finally:
+        _results[name]["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+
+async def run_warmups(budget_seconds: float = CACHE_WARMUP_BUDGET_SECONDS) -> None:
+    """Run every registered warmer concurrently; whatever is unfinished after the budget is cancelled."""
+    _state.update(status="warming", started_at=datetime.now(timezone.utc).isoformat())
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(_run_one(name, func), name=f"warmup:{name}") for name, func in _warmers.items()]
+    if tasks:
+        _, pending = await asyncio.wait(tasks, timeout=budget_seconds)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+    complete = all(r["status"] == "ok" for r in _results.values())
+    _state.update(
+        status="ready" if complete else "degraded",
+        finished_at=datetime.now(timezone.utc).isoformat(),
+        elapsed_ms=elapsed_ms,
+    )
+    logger.info(f"Cache warm-up {_state['status']} in {elapsed_ms}ms: {', '.join(_warmers) or 'nothing registered'}")
+
+
+def start_warmup() -> None:
+    """Start warming in the background (called from the app lifespan)."""
+    global _task
+    if not CACHE_WARMUP_ENABLED:
+        _state["status"] = "disabled"
+        return
+    if _task is None or _task.done():
+        _task = asyncio.create_task(run_warmups(), name="cache-warmup")
+
+
+async def stop_warmup() -> None:
+    global _task
+    if _task is not None and not _task.done():
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+    _task = None
+
+
+def is_warm() -> bool:
+    """True once warm-up has finished (even partially) or is disabled."""
+    return _state["status"] in ("ready", "degraded", "disabled")
+
+
+def get_warmup_status() -> dict:
+    return {**_state, "warmers": dict(_results)}